@@ -0,0 +1,235 @@
+import os
+import threading
+from types import MappingProxyType
+from typing import NamedTuple
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    from pyarrow import feather
+except ImportError:  # Snapshots are optional; fall back to parsing the xlsx
+    pa = None
+    feather = None
+
+# Workbooks shared by the district, zone, location and Pakistan-wide modes
+DISTRICT_WORKBOOK = "Agro ecological data district dominant.xlsx"
+ZONE_WORKBOOK = "zone wise data.xlsx"
+
+# Sheets read from every workbook
+SHEETS = ["agro zones", "organic farming"]
+
+# Workbook column -> record field
+COLUMN_FIELDS = {
+    "Zones": "zones",
+    "Names": "names",
+    "Province": "province",
+    "District": "district",
+    "Districts": "districts",
+    "Climate": "climate",
+    "Soil Types": "soil_types",
+    "Major crops": "major_crops",
+    "Rain fall": "rainfall"
+}
+
+# Zone names spelled differently in the two workbooks, AGRO_ZONES and the zone
+# GeoJSON; find_zone tries every spelling in a group
+ZONE_ALIASES = [
+    ("barani lands", "barani (rainfed) lands"),
+    ("sulaiman piedmont", "suleiman piedmont"),
+]
+
+class AgroRecord(NamedTuple):
+    """One row of an "agro zones" sheet with precomputed lowercase lookup keys"""
+    zones: str
+    names: str
+    province: str
+    district: str
+    districts: str
+    climate: str
+    soil_types: str
+    major_crops: str
+    rainfall: str
+    names_key: str
+    province_key: str
+    district_key: str
+    crops_key: str
+
+class AgroDataset:
+    """Immutable, indexed in-memory copy of one workbook"""
+
+    __slots__ = ("path", "mtime", "records", "qa_pairs", "by_location", "by_zone_name")
+
+    def __init__(self, path, mtime, records, qa_pairs):
+        self.path = path
+        self.mtime = mtime
+        self.records = tuple(records)
+        self.qa_pairs = tuple(qa_pairs)
+
+        by_location = {}
+        by_zone_name = {}
+        for row_id, record in enumerate(self.records):
+            by_location.setdefault((record.province_key, record.district_key), []).append(row_id)
+            by_zone_name.setdefault(record.names_key, []).append(row_id)
+
+        self.by_location = MappingProxyType({k: tuple(v) for k, v in by_location.items()})
+        self.by_zone_name = MappingProxyType({k: tuple(v) for k, v in by_zone_name.items()})
+
+    def find_location(self, province, district):
+        """Return records for a district, falling back to partial name matching"""
+        province_norm = province.strip().lower()
+        district_norm = district.strip().lower()
+
+        row_ids = self.by_location.get((province_norm, district_norm))
+        if row_ids:
+            return [self.records[i] for i in row_ids]
+
+        # If exact match not found, try partial matching
+        return [
+            r for r in self.records
+            if province_norm in r.province_key and district_norm in r.district_key
+        ]
+
+    def find_zone(self, zone):
+        """Return records whose zone name contains the given zone name or one of its aliases"""
+        zone_norm = zone.strip().lower()
+        names = [zone_norm]
+        for group in ZONE_ALIASES:
+            if zone_norm in group:
+                names.extend(name for name in group if name != zone_norm)
+
+        for name in names:
+            matches = [r for r in self.records if name in r.names_key]
+            if not matches:
+                matches = [self.records[i] for i in self.by_zone_name.get(name, ())]
+            if matches:
+                return matches
+        return []
+
+def _clean(value):
+    """Normalise a cell value to a stripped string, using 'N/A' for blanks"""
+    if value is None or pd.isna(value):
+        return "N/A"
+    text = str(value).strip()
+    return text if text and text.lower() != "nan" else "N/A"
+
+def _parse_records(df):
+    """Convert the agro zones sheet into AgroRecord tuples"""
+    df = df.rename(columns=lambda c: str(c).strip())
+    records = []
+    for values in df.to_dict("records"):
+        fields = {field: _clean(values.get(column)) for column, field in COLUMN_FIELDS.items()}
+        records.append(AgroRecord(
+            **fields,
+            names_key=fields["names"].lower(),
+            province_key=fields["province"].lower(),
+            district_key=fields["district"].lower(),
+            crops_key=fields["major_crops"].lower()
+        ))
+    return records
+
+def _parse_qa_pairs(df):
+    """Convert the organic farming sheet into (question, answer) pairs"""
+    pairs = []
+    for question, answer in df.iloc[:, :2].itertuples(index=False, name=None):
+        question = _clean(question)
+        answer = _clean(answer)
+        if question != "N/A" and answer != "N/A":
+            pairs.append((question, answer))
+    return pairs
+
+def snapshot_path(path, sheet):
+    """Return the columnar snapshot file for one sheet, stored next to the xlsx"""
+    base = os.path.splitext(path)[0]
+    return f"{base}.{sheet.replace(' ', '_')}.feather"
+
+def write_snapshot(path, sheets=None):
+    """Write the workbook's sheets to Feather snapshots tagged with the xlsx mtime"""
+    if feather is None:
+        return False
+
+    if sheets is None:
+        sheets = pd.read_excel(path, sheet_name=SHEETS)
+    source_mtime = str(os.path.getmtime(path)).encode()
+
+    try:
+        for sheet, df in sheets.items():
+            # Arrow needs uniform column types: store every cell as text or null
+            df = df.rename(columns=lambda c: str(c).strip())
+            df = df.astype(object).where(df.notna(), None)
+            df = df.apply(lambda col: col.map(lambda v: v if v is None else str(v)))
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            table = table.replace_schema_metadata({b"source_mtime": source_mtime})
+            feather.write_feather(table, snapshot_path(path, sheet), compression="uncompressed")
+        return True
+    except Exception as e:
+        print(f"Error writing snapshot for {path}: {e}")
+        return False
+
+def read_snapshot(path):
+    """Read the sheets from their snapshots, or None if missing or stale"""
+    if feather is None:
+        return None
+
+    source_mtime = str(os.path.getmtime(path)).encode()
+    sheets = {}
+    try:
+        for sheet in SHEETS:
+            snapshot = snapshot_path(path, sheet)
+            if not os.path.exists(snapshot):
+                return None
+            table = feather.read_table(snapshot, memory_map=True)
+            if (table.schema.metadata or {}).get(b"source_mtime") != source_mtime:
+                return None
+            sheets[sheet] = table.to_pandas()
+        return sheets
+    except Exception as e:
+        print(f"Error reading snapshot for {path}: {e}")
+        return None
+
+def read_sheets(path):
+    """Read both sheets, preferring the snapshot and regenerating it when stale"""
+    sheets = read_snapshot(path)
+    if sheets is not None:
+        return sheets
+
+    sheets = pd.read_excel(path, sheet_name=SHEETS)
+    write_snapshot(path, sheets)
+    return sheets
+
+# Global cache of parsed workbooks keyed by path
+_datasets = {}
+_lock = threading.Lock()
+
+def load_dataset(path):
+    """Return the parsed workbook, re-reading it only when its mtime changes"""
+    mtime = os.path.getmtime(path)
+
+    with _lock:
+        dataset = _datasets.get(path)
+        if dataset is not None and dataset.mtime == mtime:
+            return dataset
+
+        sheets = read_sheets(path)
+        dataset = AgroDataset(
+            path,
+            mtime,
+            _parse_records(sheets["agro zones"]),
+            _parse_qa_pairs(sheets["organic farming"])
+        )
+        _datasets[path] = dataset
+        print(f"Loaded {len(dataset.records)} agro zone rows and {len(dataset.qa_pairs)} Q&A pairs from {path}")
+        return dataset
+
+def get_district_dataset():
+    """Return the district-dominant workbook"""
+    return load_dataset(DISTRICT_WORKBOOK)
+
+def get_zone_dataset():
+    """Return the zone-wise workbook"""
+    return load_dataset(ZONE_WORKBOOK)
+
+if __name__ == "__main__":
+    for workbook in (DISTRICT_WORKBOOK, ZONE_WORKBOOK):
+        if write_snapshot(workbook):
+            print(f"Wrote snapshots for {workbook}")
@@ -0,0 +1,159 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from embedding_cache import embed_query
+
+# Cache bounds; answers older than the TTL are recomputed
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+
+# Minimum cosine similarity for a paraphrase to reuse a cached answer (0 disables).
+# Off by default: ada-002 similarities sit in a narrow high band, so questions
+# that differ in one word ("major" vs "minor" crops) score above any threshold
+# not measured on real question pairs.
+SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+
+def data_version(path):
+    """Version tag for answers derived from a data file (its mtime), or None"""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+def normalise_question(question):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(re.findall(r"[a-z0-9]+", question.lower()))
+
+def embed_question(question):
+    """Unit-length embedding of a question, or None if embedding fails.
+
+    Uses the same in-memory query embeddings as retrieval, so a cache miss
+    followed by retrieval embeds the question only once.
+    """
+    try:
+        vector = np.asarray(embed_query(question), dtype=np.float32)
+    except Exception as e:
+        print(f"Error embedding question for answer cache: {e}")
+        return None
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+class AnswerCache:
+    """Thread-safe LRU of final answers with a TTL and paraphrase matching.
+
+    Scopes are tuples such as ("district", province, district, data_version)
+    so answers never leak across modes, locations or data file revisions.
+    Lookups try the normalised question text first, then, if a similarity
+    threshold is set, the most similar cached question in the same scope.
+    """
+
+    def __init__(self, max_size=2000, ttl=24 * 3600, similarity_threshold=0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()
+        self._scopes = {}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            scope_keys = self._scopes.get(key[0])
+            if scope_keys is not None:
+                scope_keys.pop(key[1], None)
+                if not scope_keys:
+                    del self._scopes[key[0]]
+
+    def _similar_key(self, scope, vector):
+        """Return the cached key in scope most similar to vector, if above threshold"""
+        scope_keys = self._scopes.get(scope)
+        if not scope_keys:
+            return None
+        candidates = [(text, v) for text, v in scope_keys.items() if v is not None]
+        if not candidates:
+            return None
+        scores = np.stack([v for _, v in candidates]) @ vector
+        best = int(np.argmax(scores))
+        if scores[best] >= self.similarity_threshold:
+            return (scope, candidates[best][0])
+        return None
+
+    def get(self, scope, question):
+        """Return the cached answer for question in scope, or None"""
+        normalised = normalise_question(question)
+        key = (scope, normalised)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires_at"] > now:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry["answer"]
+            if entry is not None:
+                self._remove(key)
+            has_scope = scope in self._scopes
+
+        if self.similarity_threshold <= 0 or not has_scope:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        vector = embed_question(question)
+        with self._lock:
+            similar = self._similar_key(scope, vector) if vector is not None else None
+            entry = self._entries.get(similar) if similar else None
+            if entry is not None and entry["expires_at"] > now:
+                self._entries.move_to_end(similar)
+                self.similar_hits += 1
+                return entry["answer"]
+            if entry is not None:
+                self._remove(similar)
+            self.misses += 1
+            return None
+
+    def put(self, scope, question, answer):
+        """Store the final answer for question in scope, evicting the least recently used"""
+        normalised = normalise_question(question)
+        vector = embed_question(question) if self.similarity_threshold > 0 else None
+        key = (scope, normalised)
+
+        with self._lock:
+            self._entries[key] = {"answer": answer, "expires_at": time.time() + self.ttl}
+            self._entries.move_to_end(key)
+            self._scopes.setdefault(scope, {})[normalised] = vector
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        """Drop all cached answers"""
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses
+            }
+
+# Process-wide cache shared by every Streamlit session
+answer_cache = AnswerCache(
+    max_size=ANSWER_CACHE_SIZE,
+    ttl=ANSWER_CACHE_TTL,
+    similarity_threshold=SIMILARITY_THRESHOLD
+)
+
+def get_answer_cache_stats():
+    """Return counters for the shared answer cache"""
+    return answer_cache.stats()
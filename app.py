@@ -1,31 +1,26 @@
 import streamlit as st
-from land_prep import get_land_prep_response, preload_agro_data, get_province_districts
-from prep_zone import get_zone_prep_response, preload_zone_data, get_agro_zones
-from web_scraper import get_web_scraper_response, preload_web_store_data
-from pakistan_context import get_pakistan_context_response, preload_pakistan_context_data
+from land_prep import stream_land_prep_response, preload_agro_data, get_province_districts
+from prep_zone import stream_zone_prep_response, preload_zone_data, get_agro_zones
+from web_scraper import stream_web_scraper_response, preload_web_store_data
+from pakistan_context import stream_pakistan_context_response, preload_pakistan_context_data
 from location_based_zone import (
-    get_location_zone_response,
+    stream_location_zone_response,
     preload_location_zone_data,
     find_agro_zone_from_location,
     get_location_name,
-    load_agro_zones_geojson
+    get_agro_zone_geometry
 )
-from datetime import datetime, timedelta
-import time
+from response_stream import ResponseStream
+from weather_service import get_weather
+from warmup import start_warmup
+from datetime import datetime
+from time import perf_counter
 import random
 import textwrap
 import base64
 import folium
 from streamlit_folium import st_folium
 from streamlit_javascript import st_javascript
-import geopandas as gpd
-from shapely.geometry import Point
-import requests
-
-# Weather API Configuration
-WEATHER_API_KEY = "fdec585c9ae956ef0e6e8c6e88016663"
-WEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
-FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast"
 
 def get_base64_of_bin_file(bin_file):
     """Convert PNG file to base64 string"""
@@ -186,8 +181,9 @@ def render_fixed_header():
 def render_sidebar_map(lat, lon, zone_name, city_name):
     """Render a small map in the sidebar with themed background and minimal spacing."""
     try:
-        agro_zones = load_agro_zones_geojson()
-        if agro_zones is None:
+        # Zone polygon comes from the shared in-memory zone index
+        zone_geom = get_agro_zone_geometry(zone_name)
+        if zone_geom is None:
             st.error("Unable to load agro-ecological zones data.")
             return
 
@@ -233,20 +229,16 @@ def render_sidebar_map(lat, lon, zone_name, city_name):
             icon=folium.Icon(color="red", icon="info-sign")
         ).add_to(m)
 
-        user_point = gpd.GeoDataFrame(geometry=[Point(lon, lat)], crs="EPSG:4326")
-        matched = gpd.sjoin(user_point, agro_zones, how="left", predicate="within")
-        if not matched.empty:
-            zone_geom = agro_zones[agro_zones['zone_name'] == zone_name].geometry.iloc[0]
-            folium.GeoJson(
-                zone_geom,
-                style_function=lambda x: {
-                    "fillColor": "#4daf4a",
-                    "color": "#2c7fb8",
-                    "weight": 2,
-                    "fillOpacity": 0.3,
-                },
-                tooltip=f"Agro Zone: {zone_name}"
-            ).add_to(m)
+        folium.GeoJson(
+            zone_geom,
+            style_function=lambda x: {
+                "fillColor": "#4daf4a",
+                "color": "#2c7fb8",
+                "weight": 2,
+                "fillOpacity": 0.3,
+            },
+            tooltip=f"Agro Zone: {zone_name}"
+        ).add_to(m)
 
         st_folium(
             m,
@@ -290,15 +282,6 @@ def get_coords():
             return None
     return None
 
-def fetch_current_and_forecast(lat, lon):
-    params = {"lat": lat, "lon": lon, "appid": WEATHER_API_KEY, "units": "metric"}
-    cur = requests.get(WEATHER_URL, params=params, timeout=8).json()
-    fc = requests.get(FORECAST_URL, params=params, timeout=8).json()
-    return cur, fc
-
-def to_local(dt_utc, tz_offset_seconds):
-    return datetime.utcfromtimestamp(dt_utc) + timedelta(seconds=tz_offset_seconds)
-
 def emoji_for(cond):
     m = {
         "Clear": "☀️", "Clouds": "☁️ ☁️", "Rain": "🌧️ 🌧️", "Drizzle": "🌦️ 🌦️",
@@ -345,7 +328,7 @@ def render_weather_forecast():
 
     lat, lon = coords
     try:
-        current, forecast = fetch_current_and_forecast(lat, lon)
+        current, forecast, forecast_model = get_weather(lat, lon)
     except Exception as e:
         st.error("Network/API error: " + str(e))
         return
@@ -357,8 +340,6 @@ def render_weather_forecast():
         st.error("Forecast API error: " + str(forecast.get("message", forecast)))
         return
 
-    tz_offset = forecast.get("city", {}).get("timezone", current.get("timezone", 0))
-
     city = current.get("name", "Unknown")
     temp_now = current["main"].get("temp")
     cond_main = current["weather"][0].get("main", "")
@@ -394,16 +375,10 @@ def render_weather_forecast():
 
     # Hourly forecast
     st.subheader("🌤️ Next Hours (Color = Rain risk)")
-    hourly_list = forecast.get("list", [])
-    hours_to_show = min(6, len(hourly_list))
-    cols = st.columns(hours_to_show)
-    for i in range(hours_to_show):
-        e = hourly_list[i]
-        local_dt = to_local(e["dt"], tz_offset)
+    hourly_items = forecast_model.hourly(6)
+    cols = st.columns(len(hourly_items)) if hourly_items else []
+    for i, (local_dt, temp_h, pop, c) in enumerate(hourly_items):
         hour_label = local_dt.strftime("%I %p")
-        temp_h = e["main"].get("temp")
-        pop = int(e.get("pop", 0) * 100)
-        c = e["weather"][0].get("main", "")
         style = hourly_card_style(pop)
         warning = " ⚠️" if pop >= 80 else ""
         cols[i].markdown(
@@ -422,22 +397,9 @@ def render_weather_forecast():
 
     # Daily forecast
     st.subheader("📅 5-Day Forecast")
-    days = {}
-    for e in hourly_list:
-        d = to_local(e["dt"], tz_offset).date()
-        if d not in days:
-            days[d] = {"temps": [], "pops": [], "conds": []}
-        days[d]["temps"].append(e["main"].get("temp"))
-        days[d]["pops"].append(e.get("pop", 0))
-        days[d]["conds"].append(e["weather"][0].get("main", ""))
-
-    day_items = list(days.items())[:5]
-    day_cols = st.columns(len(day_items))
-    for idx, (d, vals) in enumerate(day_items):
-        min_t = min(vals["temps"])
-        max_t = max(vals["temps"])
-        avg_pop = int(sum(vals["pops"]) / len(vals["pops"]) * 100) if vals["pops"] else 0
-        cond_day = max(set(vals["conds"]), key=vals["conds"].count) if vals["conds"] else ""
+    day_items = forecast_model.daily(5)
+    day_cols = st.columns(len(day_items)) if day_items else []
+    for idx, (d, min_t, max_t, avg_pop, cond_day) in enumerate(day_items):
         style = daily_card_style(cond_day, avg_pop)
         warning = " ⚠️" if avg_pop >= 80 else ""
         day_cols[idx].markdown(
@@ -452,6 +414,12 @@ def render_weather_forecast():
             unsafe_allow_html=True,
         )
 
+    # Rain-free spells long enough for spraying
+    windows = forecast_model.rain_free_windows()
+    if windows:
+        spells = ", ".join(f"{start.strftime('%a %I %p')} – {end.strftime('%a %I %p')}" for start, end in windows[:3])
+        st.markdown(f"🧴 **Dry spraying windows:** {spells}")
+
     # Legend
     st.markdown(
         """
@@ -497,9 +465,15 @@ def preload_data_for_option(option):
     except Exception:
         return False
 
+@st.cache_resource(show_spinner=False)
+def init_warmup():
+    """Start background preloading of every mode, index bundle first, once per server process"""
+    return start_warmup()
+
 def main():
     st.set_page_config(page_title="🌱 Organic Farming Assistant", page_icon="🌿", layout="wide")
     inject_custom_css()
+    init_warmup()
 
     # Initialize session state
     if "chat_history" not in st.session_state:
@@ -759,49 +733,57 @@ def main():
 
         try:
             if st.session_state.current_option == "District Wise":
-                full_response = get_land_prep_response(
+                response_stream = stream_land_prep_response(
                     user_question,
                     st.session_state.current_province,
                     st.session_state.current_district
                 )
             elif st.session_state.current_option == "Agro Zone Wise":
-                full_response = get_zone_prep_response(
+                response_stream = stream_zone_prep_response(
                     user_question,
                     st.session_state.current_zone
                 )
             elif st.session_state.current_option == "Location Based":
                 city_name = getattr(st.session_state, 'location_city', 'Unknown')
-                full_response = get_location_zone_response(
+                response_stream = stream_location_zone_response(
                     user_question,
                     st.session_state.location_zone,
                     city_name
                 )
             elif st.session_state.current_option == "All Pakistan Context":
-                full_response = get_pakistan_context_response(user_question)
+                response_stream = stream_pakistan_context_response(user_question)
             else:
-                full_response = get_web_scraper_response(user_question)
+                response_stream = stream_web_scraper_response(user_question)
 
         except Exception as e:
-            full_response = f"❌ Error generating response: {str(e)}"
-
-        # Stream response
-        streamed_text = ""
-        words = full_response.split()
+            response_stream = ResponseStream.from_text(f"❌ Error generating response: {str(e)}")
 
-        for word in words:
-            streamed_text += word + " "
+        def render_partial(text):
             response_placeholder.markdown(f"""
                 <div class="chat-wrapper">
                     <div class="chat-container bot-message">
                         <div class="avatar">🤖</div>
                         <div>
-                            <div>{streamed_text}</div>
+                            <div>{text}</div>
                             <div class="timestamp">{datetime.now().strftime("%I:%M %p")}</div>
                         </div>
                     </div>
                 </div>
             """, unsafe_allow_html=True)
-            time.sleep(0.02)
+
+        # Render tokens as the LLM produces them, redrawing at most every 50 ms
+        streamed_text = ""
+        last_render = 0.0
+        for token in response_stream:
+            streamed_text += token
+            now = perf_counter()
+            if now - last_render >= 0.05:
+                render_partial(streamed_text)
+                last_render = now
+
+        # Final post-processed answer (trimmed fragments, location prefixes)
+        full_response = response_stream.text
+        render_partial(full_response)
 
         st.session_state.chat_history.append({
             "role": "bot",
@@ -0,0 +1,73 @@
+import sys
+import time
+import numpy as np
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.embeddings import FakeEmbeddings
+from vector_backend import NumpyIndex
+
+# text-embedding-3-small / ada-002 dimension
+DIMENSION = 1536
+CORPUS_SIZES = [300, 1000, 5000]
+QUERIES = 200
+K = 12
+REPEATS = 3
+
+def make_corpus(n, dimension, seed=0):
+    """Clustered unit vectors, roughly how chunk embeddings of one corpus sit"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((max(n // 20, 1), dimension)).astype(np.float32)
+    vectors = centres[rng.integers(0, len(centres), n)] + 0.5 * rng.standard_normal((n, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def make_store(index, vectors):
+    """LangChain FAISS wrapper (docstore, id map) around a filled index"""
+    store = FAISS(FakeEmbeddings(size=vectors.shape[1]), index, InMemoryDocstore(), {})
+    store.add_embeddings([(f"chunk {i}", v.tolist()) for i, v in enumerate(vectors)])
+    return store
+
+def timed(function, queries):
+    """Best-of-REPEATS milliseconds per query"""
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function(queries)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000 / len(queries)
+
+def recall(found, exact):
+    return np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found.tolist(), exact.tolist())])
+
+def run(n):
+    vectors = make_corpus(n, DIMENSION)
+    queries = make_corpus(QUERIES, DIMENSION, seed=1)
+
+    flat = faiss.IndexFlatL2(DIMENSION)
+    flat.add(vectors)
+    _, exact = flat.search(queries, K)
+
+    store = make_store(faiss.IndexFlatL2(DIMENSION), vectors)
+    rows = [
+        ("langchain FAISS wrapper", timed(lambda qs: [store.similarity_search_with_score_by_vector(q.tolist(), k=K) for q in qs], queries), 1.0),
+        ("faiss IndexFlatL2, per query", timed(lambda qs: [flat.search(q[None, :], K) for q in qs], queries), 1.0),
+        ("faiss IndexFlatL2, batched", timed(lambda qs: flat.search(qs, K), queries), 1.0),
+    ]
+    for dtype in ("float32", "float16", "int8"):
+        index = NumpyIndex(DIMENSION, dtype)
+        index.add(vectors)
+        _, found = index.search(queries, K)
+        rows.append((f"numpy {dtype}, per query", timed(lambda qs: [index.search(q[None, :], K) for q in qs], queries), recall(found, exact)))
+        rows.append((f"numpy {dtype}, batched", timed(lambda qs: index.search(qs, K), queries), recall(found, exact)))
+
+    numpy_store = make_store(NumpyIndex(DIMENSION), vectors)
+    rows.append(("langchain wrapper on numpy", timed(lambda qs: [numpy_store.similarity_search_with_score_by_vector(q.tolist(), k=K) for q in qs], queries), 1.0))
+
+    print(f"\n{n} vectors x {DIMENSION} dims, {QUERIES} queries, k={K}")
+    print(f"{'backend':<32}{'ms/query':>10}{'recall':>9}")
+    for name, ms, hits in rows:
+        print(f"{name:<32}{ms:>10.3f}{hits:>9.3f}")
+
+if __name__ == "__main__":
+    for n in [int(a) for a in sys.argv[1:]] or CORPUS_SIZES:
+        run(n)
@@ -0,0 +1,141 @@
+import os
+import json
+import shutil
+from collections import defaultdict
+from datetime import datetime
+from langchain.schema import Document
+from agro_data import get_district_dataset, get_zone_dataset
+from land_prep import PROVINCE_DISTRICTS, CHUNKING, build_agro_record_text, create_vectorstore
+from prep_zone import AGRO_ZONES, build_zone_record_text
+from vector_index import FORMAT_VERSION, save_vectorstore
+from index_bundle import (
+    BUNDLE_BACKEND,
+    BUNDLE_DIR,
+    BUNDLE_VERSION,
+    GLOBAL_INDEX,
+    MANIFEST_FILE,
+    get_source_hashes,
+    is_bundle_current,
+    load_index_bundle,
+    location_key
+)
+
+def get_geojson_zone_names():
+    """Return zone names used by the location-based map so they hit the bundle too"""
+    try:
+        with open("ali_try3_colors.geojson", "r", encoding="utf-8") as f:
+            features = json.load(f).get("features", [])
+        return sorted({f["properties"]["zone_name"] for f in features if f["properties"].get("zone_name")})
+    except Exception as e:
+        print(f"Error reading zone names from GeoJSON: {e}")
+        return []
+
+def build_global_documents(district_dataset, zone_dataset):
+    """One document per workbook row and per Q&A pair, tagged for metadata filters.
+
+    District rows carry "location" keys for every (province, district) the
+    District Wise mode resolves to them, zone rows carry "zone_key" names for
+    every zone the zone modes resolve to them, and Q&A pairs shared by both
+    workbooks are stored once with both sheets in "qa_sheet".
+    """
+    documents = []
+
+    # Tag each record with the location lookups that select it (keyed by record identity)
+    location_keys = defaultdict(list)
+    for province, districts in PROVINCE_DISTRICTS.items():
+        for district in districts:
+            for record in district_dataset.find_location(province, district):
+                location_keys[id(record)].append(location_key(province, district))
+
+    for record in district_dataset.records:
+        documents.append(Document(
+            page_content=build_agro_record_text(record),
+            metadata={
+                "source": "agro_zones",
+                "type": "district",
+                "province": record.province,
+                "district": record.district,
+                "zone": record.names,
+                "crops": record.major_crops,
+                "location": location_keys[id(record)]
+            }
+        ))
+
+    zone_keys = defaultdict(list)
+    zones = list(AGRO_ZONES) + [z for z in get_geojson_zone_names() if z not in AGRO_ZONES]
+    for zone in zones:
+        for record in zone_dataset.find_zone(zone):
+            zone_keys[id(record)].append(zone)
+
+    for record in zone_dataset.records:
+        documents.append(Document(
+            page_content=build_zone_record_text(record),
+            metadata={
+                "source": "agro_zones",
+                "type": "zone",
+                "zone": record.names,
+                "zone_key": zone_keys[id(record)]
+            }
+        ))
+
+    qa_sheets = defaultdict(list)
+    for sheet, dataset in (("district", district_dataset), ("zone", zone_dataset)):
+        for pair in dataset.qa_pairs:
+            if sheet not in qa_sheets[pair]:
+                qa_sheets[pair].append(sheet)
+
+    for (question, answer), sheets in qa_sheets.items():
+        documents.append(Document(
+            page_content=f"GENERAL ORGANIC FARMING:\n\nQ: {question}\nA: {answer}",
+            metadata={"source": "organic_farming", "type": "general", "qa_sheet": sheets}
+        ))
+
+    return documents
+
+def build_index_bundle():
+    """Build the single global index shared by every mode"""
+    build_dir = BUNDLE_DIR + ".tmp"
+    if os.path.exists(build_dir):
+        shutil.rmtree(build_dir)
+    os.makedirs(build_dir)
+
+    sources = get_source_hashes()
+    documents = build_global_documents(get_district_dataset(), get_zone_dataset())
+    save_vectorstore(
+        create_vectorstore(documents, backend=BUNDLE_BACKEND),
+        os.path.join(build_dir, GLOBAL_INDEX),
+        chunking=CHUNKING,
+        sources=sources
+    )
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "bundle_version": BUNDLE_VERSION,
+        "backend": BUNDLE_BACKEND,
+        "built_at": datetime.now().isoformat(),
+        "sources": sources,
+        "index": GLOBAL_INDEX,
+        "documents": len(documents)
+    }
+    with open(os.path.join(build_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Swap the finished bundle into place
+    if os.path.exists(BUNDLE_DIR):
+        shutil.rmtree(BUNDLE_DIR)
+    os.rename(build_dir, BUNDLE_DIR)
+    print(f"Index bundle written to {BUNDLE_DIR} ({len(documents)} documents)")
+
+def ensure_index_bundle():
+    """Build the bundle if it is missing or stale, then load it"""
+    try:
+        if not is_bundle_current():
+            print("Building index bundle...")
+            build_index_bundle()
+        return load_index_bundle()
+    except Exception as e:
+        print(f"Error preparing index bundle: {e}")
+        return False
+
+if __name__ == "__main__":
+    build_index_bundle()
@@ -0,0 +1,56 @@
+import threading
+import httpx
+from langchain_openai import ChatOpenAI
+
+# Chat model used by every mode
+LLM_MODEL = "gpt-4-turbo"
+
+# One pooled HTTP client keeps TLS connections to the LLM endpoint alive across queries
+_http_client = httpx.Client(
+    limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+    timeout=httpx.Timeout(60.0, connect=10.0)
+)
+
+# Global registries for LLM clients and QA chains
+_llms = {}
+_chains = {}
+_lock = threading.Lock()
+
+def get_llm(max_tokens, request_timeout=None):
+    """Return a shared ChatOpenAI client for the given settings"""
+    key = (LLM_MODEL, max_tokens, request_timeout)
+    with _lock:
+        llm = _llms.get(key)
+        if llm is None:
+            llm = ChatOpenAI(
+                temperature=0,
+                model=LLM_MODEL,
+                max_tokens=max_tokens,
+                request_timeout=request_timeout,
+                http_client=_http_client
+            )
+            _llms[key] = llm
+        return llm
+
+def get_chain(key, factory):
+    """Return the chain registered under key, building it with factory() once.
+
+    Keys are (mode, location context) tuples such as ("pakistan",) or
+    ("web_store",); chains are reused across queries and sessions.
+    """
+    with _lock:
+        chain = _chains.get(key)
+    if chain is not None:
+        return chain
+
+    chain = factory()
+    if chain is None:
+        return None
+    with _lock:
+        # Keep the first chain if another thread finished building concurrently
+        return _chains.setdefault(key, chain)
+
+def invalidate_chain(key):
+    """Drop a registered chain, e.g. after its vectorstore was rebuilt"""
+    with _lock:
+        _chains.pop(key, None)
@@ -0,0 +1,187 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+import numpy as np
+from langchain.schema import Document
+from langchain_core.prompts import format_document
+from embedding_cache import embed_query
+from chain_registry import LLM_MODEL
+
+# Context token budget per mode; the best-ranked chunks are packed until it is full
+CONTEXT_BUDGETS = {
+    "district": 800,
+    "zone": 800,
+    "location": 800,
+    "pakistan": 1500,
+    "web_store": 1200,
+}
+DEFAULT_CONTEXT_BUDGET = 1000
+
+# Candidates retrieved per chunk the chain asks for, before dedupe and packing
+CANDIDATE_MULTIPLIER = 2
+
+# Chunks from the same document are joined when one starts with the other's tail
+MIN_OVERLAP = 20
+MAX_OVERLAP = 400
+
+CONTEXT_CACHE_SIZE = int(os.getenv("CONTEXT_CACHE_SIZE", "1024"))
+
+# Used when the tokenizer files cannot be loaded (e.g. offline)
+CHARS_PER_TOKEN = 4
+
+class PackedContext(NamedTuple):
+    text: str
+    tokens: int
+    chunks: int
+    candidates: int
+
+_encoding = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+def count_tokens(text):
+    """Count tokens with the chat model's tokenizer, estimating if it is unavailable"""
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.encoding_for_model(LLM_MODEL)
+                except Exception as e:
+                    print(f"Tokenizer unavailable, estimating token counts: {e}")
+                    _encoding_failed = True
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def join_overlap(first, second):
+    """Return first + second without their shared overlap, or None if they do not overlap"""
+    probe = second[:MIN_OVERLAP]
+    start = first.find(probe, max(0, len(first) - MAX_OVERLAP))
+    while start != -1:
+        if second.startswith(first[start:]):
+            return first + second[len(first) - start:]
+        start = first.find(probe, start + 1)
+    return None
+
+def merge_overlapping(scored):
+    """Merge chunks of the same document that overlap or contain each other.
+
+    scored is a list of (document, score); a merged chunk keeps the best score.
+    """
+    merged = []
+    for document, score in scored:
+        text = document.page_content
+        for entry in merged:
+            if entry[0].metadata != document.metadata:
+                continue
+            current = entry[0].page_content
+            if text in current:
+                combined = current
+            elif current in text:
+                combined = text
+            else:
+                combined = join_overlap(current, text) or join_overlap(text, current)
+            if combined is not None:
+                entry[0] = Document(page_content=combined, metadata=document.metadata)
+                entry[1] = max(entry[1], score)
+                break
+        else:
+            merged.append([document, score])
+    return [(document, score) for document, score in merged]
+
+def pack_context(scored, combine_chain, budget):
+    """Format the best-scored chunks and pack them into the token budget"""
+    formatted = []
+    used = 0
+    candidates = sorted(merge_overlapping(scored), key=lambda item: item[1], reverse=True)
+    for document, _ in candidates:
+        text = format_document(document, combine_chain.document_prompt)
+        tokens = count_tokens(text)
+        # The best chunk is always included, even if it alone exceeds the budget
+        if formatted and used + tokens > budget:
+            continue
+        formatted.append(text)
+        used += tokens
+    return PackedContext(
+        text=combine_chain.document_separator.join(formatted),
+        tokens=used,
+        chunks=len(formatted),
+        candidates=len(scored)
+    )
+
+class ContextCache:
+    """Thread-safe LRU of packed contexts keyed by (mode, scope, filters, query embedding)"""
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            context = self._entries.get(key)
+            if context is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return context
+
+    def put(self, key, context):
+        with self._lock:
+            self._entries[key] = context
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return context
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+# Process-wide cache shared by every mode
+context_cache = ContextCache(max_size=CONTEXT_CACHE_SIZE)
+
+def build_context(qa_chain, query, mode=None, scope=None):
+    """Retrieve, dedupe and pack the context for a "stuff" RetrievalQA chain.
+
+    Returns (PackedContext, cached). scope is the caller's data scope (e.g.
+    the answer-cache scope, which carries data versions); without it the
+    packed context is not cached.
+    """
+    retriever = qa_chain.retriever
+    combine_chain = qa_chain.combine_documents_chain
+    budget = CONTEXT_BUDGETS.get(mode, DEFAULT_CONTEXT_BUDGET)
+
+    # Only the hybrid retriever reports scores; others are ranked by position
+    if not hasattr(retriever, "search_with_scores"):
+        documents = retriever.invoke(query)
+        scored = [(document, 1.0 / (rank + 1)) for rank, document in enumerate(documents)]
+        return pack_context(scored, combine_chain, budget), False
+
+    embedding = embed_query(query)
+    key = None
+    if scope is not None:
+        digest = hashlib.sha1(np.asarray(embedding, dtype=np.float16).tobytes()).hexdigest()
+        filters = json.dumps(getattr(retriever, "filters", []), sort_keys=True)
+        key = (mode, scope, filters, digest)
+        context = context_cache.get(key)
+        if context is not None:
+            return context, True
+
+    scored = retriever.search_with_scores(query, k=retriever.k * CANDIDATE_MULTIPLIER, embedding=list(embedding))
+    context = pack_context(scored, combine_chain, budget)
+    if key is not None:
+        context_cache.put(key, context)
+    return context, False
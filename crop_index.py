@@ -0,0 +1,105 @@
+import re
+
+# Multi-word crop names collapsed to a single token before tokenising
+MULTIWORD_CROPS = {
+    "sugar cane": "sugarcane",
+    "sugar beet": "sugarbeet",
+    "rape seed": "rapeseed",
+    "ground nut": "groundnut",
+    "sweet potato": "sweetpotato",
+}
+
+# Variant spellings, local names and plurals -> canonical crop token
+CROP_SYNONYMS = {
+    "corn": "maize",
+    "makki": "maize",
+    "paddy": "rice",
+    "chilli": "chili",
+    "chillies": "chili",
+    "chilies": "chili",
+    "chillis": "chili",
+    "orange": "citrus",
+    "oranges": "citrus",
+    "kinnow": "citrus",
+    "kinnows": "citrus",
+    "chickpea": "gram",
+    "chickpeas": "gram",
+    "peanut": "groundnut",
+    "peanuts": "groundnut",
+    "jowar": "sorghum",
+    "bajra": "millet",
+    "masoor": "lentil",
+    "sarson": "mustard",
+    "rape": "rapeseed",
+    "canola": "rapeseed",
+    "lucerne": "alfalfa",
+    "peaches": "peach",
+    # Words ending in "s" that are not plurals
+    "citrus": "citrus",
+    "grass": "grass",
+}
+
+# Canonical crop names exposed as the crop vocabulary
+KNOWN_CROPS = {
+    "wheat", "rice", "cotton", "sugarcane", "maize", "millet", "sorghum", "barley",
+    "gram", "lentil", "mung", "mash", "pulse", "oilseed", "mustard", "rapeseed",
+    "sunflower", "sesame", "groundnut", "guar", "castor", "berseem", "alfalfa",
+    "fodder", "tobacco", "potato", "onion", "tomato", "chili", "garlic", "ginger",
+    "turmeric", "vegetable", "fruit", "mango", "citrus", "banana", "apple", "grape",
+    "date", "guava", "apricot", "peach", "plum", "pear", "pomegranate", "almond",
+    "walnut", "cherry", "olive", "melon", "watermelon", "sugarbeet", "sweetpotato",
+    "tea", "jute", "oat"
+}
+
+def normalise_crop(token):
+    """Map a crop word to its canonical token (handles synonyms and plurals)"""
+    token = token.strip().lower()
+    token = MULTIWORD_CROPS.get(token, token)
+    if token in CROP_SYNONYMS:
+        return CROP_SYNONYMS[token]
+
+    if token.endswith("oes") and len(token) > 4:
+        token = token[:-2]
+    elif token.endswith("ies") and len(token) > 4:
+        token = token[:-3] + "y"
+    elif token.endswith("s") and not token.endswith("ss") and len(token) > 3:
+        token = token[:-1]
+
+    return CROP_SYNONYMS.get(token, token)
+
+def crop_words(text):
+    """Split free text into normalised crop tokens, in order of appearance"""
+    text = text.lower()
+    for phrase, joined in MULTIWORD_CROPS.items():
+        text = text.replace(phrase, joined)
+    return [normalise_crop(word) for word in re.findall(r"[a-z]{3,}", text)]
+
+class CropIndex:
+    """Inverted index from normalised crop tokens to agro zone record ids"""
+
+    def __init__(self, records):
+        postings = {}
+        for row_id, record in enumerate(records):
+            for token in set(crop_words(record.major_crops)):
+                postings.setdefault(token, set()).add(row_id)
+
+        self.postings = {token: frozenset(ids) for token, ids in postings.items()}
+        self.vocabulary = frozenset(token for token in self.postings if token in KNOWN_CROPS)
+
+    def lookup(self, crop):
+        """Return record ids listing the crop among their major crops"""
+        return self.postings.get(normalise_crop(crop), frozenset())
+
+    def lookup_all(self, crops):
+        """Return record ids listing every one of the crops"""
+        id_sets = sorted((self.lookup(crop) for crop in crops), key=len)
+        if not id_sets:
+            return frozenset()
+        result = id_sets[0]
+        for ids in id_sets[1:]:
+            result = result & ids
+        return result
+
+    def extract(self, text):
+        """Return the known crops mentioned in text, in order of appearance"""
+        return [crop for crop in dict.fromkeys(crop_words(text)) if crop in self.vocabulary]
@@ -0,0 +1,41 @@
+import os
+from functools import lru_cache
+from langchain_openai import OpenAIEmbeddings
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
+
+# Embedding model shared by every vectorstore builder
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# On-disk cache location (one file per embedded chunk)
+EMBEDDING_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedding_cache")
+
+# Query embeddings kept in memory, shared by the answer cache and retrieval
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+
+# Global variable to cache the embeddings wrapper
+_cached_embeddings = None
+
+def get_embeddings():
+    """Return OpenAI embeddings backed by a shared on-disk cache.
+
+    Cache keys are a hash of the chunk text namespaced by the model name, so
+    identical chunks (e.g. the "organic farming" Q&A sheet) are embedded only
+    once across all modes, location switches and process restarts.
+    """
+    global _cached_embeddings
+
+    if _cached_embeddings is None:
+        underlying = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+        store = LocalFileStore(EMBEDDING_CACHE_DIR)
+        _cached_embeddings = CacheBackedEmbeddings.from_bytes_store(
+            underlying,
+            store,
+            namespace=EMBEDDING_MODEL
+        )
+    return _cached_embeddings
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def embed_query(query):
+    """Embedding of a query string as a tuple, computed once per distinct query"""
+    return tuple(get_embeddings().embed_query(query))
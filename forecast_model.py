@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+import numpy as np
+
+# OpenWeather forecast entries are 3 hours apart
+STEP_SECONDS = 3 * 3600
+
+# Conditions that rule out spraying regardless of rain probability
+WET_CONDITIONS = {"Rain", "Drizzle", "Thunderstorm", "Snow"}
+
+EPOCH = datetime(1970, 1, 1)
+
+class ForecastModel:
+    """OpenWeather 5-day/3-hour forecast parsed once into numpy arrays.
+
+    Times are kept as local seconds (UTC + the city's offset) so hourly
+    labels and day boundaries need no per-entry datetime conversion.
+    """
+
+    def __init__(self, forecast, tz_offset=None):
+        entries = sorted(forecast.get("list", []), key=lambda e: e["dt"])
+        if tz_offset is None:
+            tz_offset = forecast.get("city", {}).get("timezone", 0)
+
+        self.local_seconds = np.array([e["dt"] for e in entries], dtype=np.int64) + int(tz_offset)
+        self.temps = np.array([e.get("main", {}).get("temp", np.nan) for e in entries], dtype=float)
+        self.pops = np.array([e.get("pop", 0) for e in entries], dtype=float)
+
+        conditions = [(e.get("weather") or [{}])[0].get("main", "") for e in entries]
+        self.condition_names, self.condition_codes = np.unique(np.array(conditions, dtype=str), return_inverse=True)
+        self.condition_names = self.condition_names.tolist()
+
+        self.days = self.local_seconds // 86400
+
+    def __len__(self):
+        return len(self.local_seconds)
+
+    def hourly(self, count=6):
+        """Return the next entries as (local datetime, temp, pop %, condition)"""
+        n = min(count, len(self))
+        pops = (self.pops[:n] * 100).astype(int)
+        return [
+            (
+                EPOCH + timedelta(seconds=int(self.local_seconds[i])),
+                self.temps[i],
+                int(pops[i]),
+                self.condition_names[self.condition_codes[i]]
+            )
+            for i in range(n)
+        ]
+
+    def daily(self, count=5):
+        """Return per-day (date, min temp, max temp, mean pop %, modal condition)"""
+        if not len(self):
+            return []
+
+        day_values, starts, day_index = np.unique(self.days, return_index=True, return_inverse=True)
+        sizes = np.diff(np.append(starts, len(self)))
+        min_t = np.minimum.reduceat(self.temps, starts)
+        max_t = np.maximum.reduceat(self.temps, starts)
+        mean_pop = (np.add.reduceat(self.pops, starts) / sizes * 100).astype(int)
+
+        # Most frequent condition per day from one (day, condition) histogram
+        n_conditions = len(self.condition_names)
+        counts = np.bincount(day_index * n_conditions + self.condition_codes, minlength=len(day_values) * n_conditions)
+        modal = counts.reshape(len(day_values), n_conditions).argmax(axis=1)
+
+        n = min(count, len(day_values))
+        return [
+            (
+                (EPOCH + timedelta(days=int(day_values[i]))).date(),
+                min_t[i],
+                max_t[i],
+                int(mean_pop[i]),
+                self.condition_names[modal[i]]
+            )
+            for i in range(n)
+        ]
+
+    def rain_free_windows(self, max_pop=0.2, min_hours=6):
+        """Return (start, end) local datetimes of dry spells long enough for spraying.
+
+        A forecast step counts as dry when its rain probability is at most
+        max_pop and its condition is not rain, drizzle, thunder or snow.
+        """
+        wet = np.isin(self.condition_names, list(WET_CONDITIONS))[self.condition_codes] if len(self) else np.zeros(0, bool)
+        dry = (self.pops <= max_pop) & ~wet
+
+        # Run boundaries of consecutive dry steps
+        edges = np.diff(np.concatenate(([0], dry.astype(np.int8), [0])))
+        run_starts = np.flatnonzero(edges == 1)
+        run_ends = np.flatnonzero(edges == -1)
+
+        min_steps = max(1, -(-min_hours * 3600 // STEP_SECONDS))
+        keep = (run_ends - run_starts) >= min_steps
+        return [
+            (
+                EPOCH + timedelta(seconds=int(self.local_seconds[start])),
+                EPOCH + timedelta(seconds=int(self.local_seconds[end - 1] + STEP_SECONDS))
+            )
+            for start, end in zip(run_starts[keep], run_ends[keep])
+        ]
@@ -0,0 +1,223 @@
+import re
+import math
+import threading
+import weakref
+from collections import defaultdict
+from typing import List
+import numpy as np
+from langchain.schema import BaseRetriever, Document
+from langchain.callbacks.manager import CallbackManagerForRetrieverRun
+from vector_backend import search_index
+
+# BM25 parameters (standard Okapi defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Reciprocal-rank fusion constant; 60 is the value from the original RRF paper
+RRF_K = 60
+
+# Each ranker contributes this many candidates per requested document
+FETCH_MULTIPLIER = 4
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Metadata fields that get a bitset per value; list values are indexed per element
+FILTER_FIELDS = ("type", "province", "district", "zone", "location", "zone_key", "qa_sheet")
+
+def tokenize(text):
+    """Lowercase word tokens; district names, zone numerals and crops survive intact"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+class BM25Index:
+    """In-memory inverted index scoring a fixed list of texts with Okapi BM25"""
+
+    def __init__(self, texts, k1=BM25_K1, b=BM25_B):
+        postings = defaultdict(dict)
+        lengths = np.zeros(len(texts), dtype=np.float32)
+        for position, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[position] = len(tokens)
+            for token in tokens:
+                counts = postings[token]
+                counts[position] = counts.get(position, 0) + 1
+
+        n = len(texts)
+        average_length = float(lengths.mean()) if n else 0.0
+        # Length normalisation folded into one per-document factor
+        self._norm = k1 * (1 - b + b * lengths / average_length) if average_length else np.full(n, k1, dtype=np.float32)
+        self._k1 = k1
+        self._size = n
+
+        # term -> (document positions, term frequencies, idf)
+        self._postings = {}
+        for token, counts in postings.items():
+            idf = math.log(1 + (n - len(counts) + 0.5) / (len(counts) + 0.5))
+            self._postings[token] = (
+                np.fromiter(counts.keys(), dtype=np.int64, count=len(counts)),
+                np.fromiter(counts.values(), dtype=np.float32, count=len(counts)),
+                idf
+            )
+
+    def search(self, query, k, allowed=None):
+        """Return up to k document positions with a positive score, best first.
+
+        allowed is an optional boolean mask restricting the candidate documents.
+        """
+        scores = np.zeros(self._size, dtype=np.float32)
+        for token in set(tokenize(query)):
+            entry = self._postings.get(token)
+            if entry is None:
+                continue
+            positions, tf, idf = entry
+            scores[positions] += idf * tf * (self._k1 + 1) / (tf + self._norm[positions])
+
+        if allowed is not None:
+            scores[~allowed] = 0
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        return matched[np.argsort(-scores[matched], kind="stable")].tolist()
+
+class MetadataIndex:
+    """Packed bitsets of document positions per metadata (field, value).
+
+    A filter is a list of {field: value} dicts: fields within a dict are
+    intersected and the dicts are unioned, e.g. this district's records OR
+    the district Q&A sheet. The result is a FAISS-compatible bitmap (and,
+    unpacked, a mask for NumpyIndex), so the dense search only ever visits
+    matching vectors.
+    """
+
+    def __init__(self, metadatas, fields=FILTER_FIELDS):
+        self.size = len(metadatas)
+        values = defaultdict(lambda: np.zeros(self.size, dtype=bool))
+        for position, metadata in enumerate(metadatas):
+            for field in fields:
+                value = metadata.get(field)
+                for item in value if isinstance(value, list) else [value]:
+                    if item is not None:
+                        values[(field, item)][position] = True
+        self._bitsets = {key: np.packbits(mask, bitorder="little") for key, mask in values.items()}
+        self._empty = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def bitmap(self, filters):
+        """Return the packed bitmap (little-endian bit order) of positions matching filters"""
+        result = self._empty.copy()
+        for clause in filters:
+            selected = ~self._empty
+            for field, value in clause.items():
+                selected = selected & self._bitsets.get((field, value), self._empty)
+            result |= selected
+        return result
+
+    def mask(self, bitmap):
+        """Unpack a bitmap into a boolean mask over positions"""
+        return np.unpackbits(bitmap, count=self.size, bitorder="little").astype(bool)
+
+# Keyword and metadata indexes per vectorstore, built on first use from the docstore
+_keyword_indexes = weakref.WeakKeyDictionary()
+_metadata_indexes = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+def _stored_documents(vectorstore):
+    documents = []
+    for position in range(vectorstore.index.ntotal):
+        document = vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+        documents.append(document if isinstance(document, Document) else Document(page_content=""))
+    return documents
+
+def get_keyword_index(vectorstore):
+    """Return the BM25 index over a FAISS vectorstore's chunks, in index order"""
+    with _lock:
+        index = _keyword_indexes.get(vectorstore)
+    if index is not None:
+        return index
+
+    index = BM25Index([d.page_content for d in _stored_documents(vectorstore)])
+    with _lock:
+        _keyword_indexes[vectorstore] = index
+    return index
+
+def get_metadata_index(vectorstore):
+    """Return the metadata bitsets of a FAISS vectorstore's chunks, in index order"""
+    with _lock:
+        index = _metadata_indexes.get(vectorstore)
+    if index is not None:
+        return index
+
+    index = MetadataIndex([d.metadata for d in _stored_documents(vectorstore)])
+    with _lock:
+        _metadata_indexes[vectorstore] = index
+    return index
+
+def forget_keyword_index(vectorstore):
+    """Drop the keyword and metadata indexes of a vectorstore whose documents changed in place"""
+    with _lock:
+        _keyword_indexes.pop(vectorstore, None)
+        _metadata_indexes.pop(vectorstore, None)
+
+class HybridRetriever(BaseRetriever):
+    """Fuses dense FAISS ranks and BM25 keyword ranks with reciprocal-rank fusion.
+
+    Several vectorstores (e.g. a location index plus the shared Q&A index)
+    are searched with one query embedding and all their rankings fused, so
+    exact names like "Toba Tek Singh" or "Zone III" rank without padding
+    the query or the documents. filters (see MetadataIndex) restrict both
+    rankers to matching chunks before searching.
+    """
+    vectorstores: list
+    k: int = 4
+    filters: list = []
+
+    def embed_query(self, query):
+        return self.vectorstores[0].embedding_function.embed_query(query)
+
+    def search_with_scores(self, query, k=None, embedding=None):
+        """Return up to k (document, fused score) pairs, best first.
+
+        embedding may be passed in when the caller already has the query vector.
+        """
+        k = k or self.k
+        fetch_k = k * FETCH_MULTIPLIER
+        if embedding is None:
+            embedding = self.embed_query(query)
+        embedding = np.array([embedding], dtype=np.float32)
+
+        scores = defaultdict(float)
+        for store_number, vectorstore in enumerate(self.vectorstores):
+            if vectorstore.index.ntotal == 0:
+                continue
+            search_k = min(fetch_k, vectorstore.index.ntotal)
+            bitmap = allowed = None
+            if self.filters:
+                metadata_index = get_metadata_index(vectorstore)
+                bitmap = metadata_index.bitmap(self.filters)
+                allowed = metadata_index.mask(bitmap)
+            _, dense = search_index(vectorstore.index, embedding, search_k, bitmap, allowed)
+            rankings = [
+                [p for p in dense[0].tolist() if p >= 0],
+                get_keyword_index(vectorstore).search(query, fetch_k, allowed)
+            ]
+            for ranking in rankings:
+                for rank, position in enumerate(ranking):
+                    scores[(store_number, position)] += 1.0 / (RRF_K + rank + 1)
+
+        best = sorted(scores, key=scores.get, reverse=True)[:k]
+        results = []
+        for store_number, position in best:
+            vectorstore = self.vectorstores[store_number]
+            document = vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+            if isinstance(document, Document):
+                results.append((document, scores[(store_number, position)]))
+        return results
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return [document for document, _ in self.search_with_scores(query)]
+
+def hybrid_retriever(vectorstore, k=4):
+    """Hybrid retriever over a FAISS vectorstore or a filtered bundle view"""
+    vectorstores = getattr(vectorstore, "vectorstores", None) or [vectorstore]
+    filters = getattr(vectorstore, "filters", None) or []
+    return HybridRetriever(vectorstores=vectorstores, k=k, filters=filters)
@@ -0,0 +1,130 @@
+import os
+import json
+from agro_data import DISTRICT_WORKBOOK, ZONE_WORKBOOK
+from vector_index import FORMAT_VERSION, file_hash, load_vectorstore
+from hybrid_retriever import hybrid_retriever, get_keyword_index, get_metadata_index
+from location_cache import location_cache
+
+# Persisted bundle layout: one global index folder plus a manifest
+BUNDLE_DIR = "index_bundle"
+MANIFEST_FILE = "manifest.json"
+GLOBAL_INDEX = "global"
+SOURCE_FILES = [DISTRICT_WORKBOOK, ZONE_WORKBOOK]
+
+# Bump when the documents built into the bundle change so old bundles are rebuilt
+BUNDLE_VERSION = 4
+
+# The global index is larger than the per-location stores; it stays on FAISS
+BUNDLE_BACKEND = "faiss"
+
+# Global variable holding the loaded global vectorstore
+_global_index = None
+
+class FilteredIndex:
+    """View of the global index restricted by metadata filters (see MetadataIndex)"""
+
+    def __init__(self, vectorstore, filters):
+        self.vectorstores = [vectorstore]
+        self.filters = filters
+
+    def as_retriever(self, search_type="similarity", search_kwargs=None):
+        return hybrid_retriever(self, k=(search_kwargs or {}).get("k", 4))
+
+def location_key(province, district):
+    """Metadata value tagging a district's records in the global index"""
+    return f"{province}/{district}"
+
+def get_mode_filters(mode, *key):
+    """Metadata filters selecting a mode's location records plus its Q&A sheet"""
+    if mode == "district":
+        province, district = key
+        return [
+            {"type": "district", "location": location_key(province, district)},
+            {"type": "general", "qa_sheet": "district"}
+        ]
+    if mode == "zone":
+        return [
+            {"type": "zone", "zone_key": key[0]},
+            {"type": "general", "qa_sheet": "zone"}
+        ]
+    if mode == "pakistan":
+        return [
+            {"type": "district"},
+            {"type": "general", "qa_sheet": "district"}
+        ]
+    raise ValueError(f"Unknown index mode: {mode}")
+
+def get_source_hashes():
+    """Return content hashes of the workbooks the bundle is built from"""
+    return {path: file_hash(path) for path in SOURCE_FILES if os.path.exists(path)}
+
+def read_manifest():
+    """Read the bundle manifest, or None if the bundle has not been built"""
+    manifest_path = os.path.join(BUNDLE_DIR, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error reading index bundle manifest: {e}")
+        return None
+
+def is_bundle_current():
+    """Check that the bundle exists, uses the current format and backend and was built from the current workbooks"""
+    manifest = read_manifest()
+    return (
+        manifest is not None
+        and manifest.get("format_version") == FORMAT_VERSION
+        and manifest.get("bundle_version") == BUNDLE_VERSION
+        and manifest.get("backend", "faiss") == BUNDLE_BACKEND
+        and manifest.get("sources") == get_source_hashes()
+    )
+
+def load_index_bundle():
+    """Open the global index with its vectors and documents memory-mapped"""
+    global _global_index
+
+    manifest = read_manifest()
+    if manifest is None:
+        print("Index bundle not found")
+        return False
+
+    try:
+        vectorstore = load_vectorstore(os.path.join(BUNDLE_DIR, manifest["index"]))
+        # Build the filter bitsets and keyword index up front so queries only intersect
+        get_metadata_index(vectorstore)
+        get_keyword_index(vectorstore)
+        _global_index = vectorstore
+        print(f"Loaded global index with {vectorstore.index.ntotal} chunks")
+        # Local indexes built while the bundle was loading are rebuilt as bundle views on next use
+        dropped = location_cache.discard(is_fallback_entry)
+        if dropped:
+            print(f"Dropped {dropped} cached local indexes in favour of the bundle")
+        return True
+    except Exception as e:
+        print(f"Error loading index bundle: {e}")
+        return False
+
+def is_bundle_loaded():
+    """True once the global index is loaded (never waits)"""
+    return _global_index is not None
+
+def is_fallback_entry(entry):
+    """True for a location_cache entry on a local index that the loaded bundle now replaces"""
+    return is_bundle_loaded() and not isinstance(entry["vectorstore"], FilteredIndex)
+
+def get_location_index(mode, *key):
+    """Filtered view of the global index for ("district", province, district), ("zone", zone) or ("pakistan",).
+
+    Returns None, without waiting, while the bundle is still building or
+    loading or when it failed. A location without records gets a view of
+    the general Q&A only.
+    """
+    if not is_bundle_loaded():
+        return None
+    filters = get_mode_filters(mode, *key)
+    if not get_metadata_index(_global_index).bitmap(filters[:1]).any():
+        print(f"No {mode} data in the index bundle for {key}; using the general Q&A only")
+        filters = filters[1:]
+    return FilteredIndex(_global_index, filters)
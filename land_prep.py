@@ -1,12 +1,20 @@
 import os
 import hashlib
-import pandas as pd
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from vector_backend import VECTOR_BACKEND, vectorstore_from_documents
 from langchain.chains import RetrievalQA
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 from langchain.prompts import PromptTemplate
+from embedding_cache import get_embeddings
+from agro_data import DISTRICT_WORKBOOK, get_district_dataset
+from chain_registry import get_llm
+from index_bundle import get_location_index, is_fallback_entry
+from hybrid_retriever import hybrid_retriever
+from location_cache import location_cache
+from single_flight import single_flight
+from response_stream import ResponseStream, stream_qa_chain
+from answer_cache import answer_cache, data_version
+from structured_answers import structured_answer
 
 # Province-District mapping
 PROVINCE_DISTRICTS = {
@@ -47,84 +55,57 @@ PROVINCE_DISTRICTS = {
     "Capital Territory": ["Islamabad"]                  
 }
 
-# Global variables to cache vectorstore
-_agro_vectorstore = None
-_agro_location = None
-
 def get_province_districts():
     """Return the province-district mapping"""
     return PROVINCE_DISTRICTS
 
+def build_agro_record_text(record):
+    """Render one agro zones row as a location-specific document"""
+    location_info = f"LOCATION-SPECIFIC DATA for {record.district}, {record.province}:\n\n"
+    location_info += f"Province: {record.province}\n"
+    location_info += f"District: {record.district}\n"
+    location_info += f"Zone: {record.zones}\n"
+    location_info += f"Area Name: {record.names}\n"
+    location_info += f"Climate: {record.climate}\n"
+    location_info += f"Soil Types: {record.soil_types}\n"
+    location_info += f"Major Crops: {record.major_crops}\n"
+    location_info += f"Rainfall: {record.rainfall}\n"
+    return location_info
+
+def build_agro_location_documents(dataset, province, district):
+    """Build location-specific documents for one district from the agro zones sheet"""
+    return [
+        Document(
+            page_content=build_agro_record_text(record),
+            metadata={"source": "agro_zones", "location": f"{district}, {province}"}
+        )
+        for record in dataset.find_location(province, district)
+    ]
+
+def build_agro_general_documents(dataset):
+    """Build general organic farming Q&A documents from the organic farming sheet"""
+    return [
+        Document(
+            page_content=f"GENERAL ORGANIC FARMING:\n\nQ: {question}\nA: {answer}\n\nKeywords: organic farming, general agriculture, farming practices",
+            metadata={"source": "organic_farming", "type": "general"}
+        )
+        for question, answer in dataset.qa_pairs
+    ]
+
 def load_agro_data(province=None, district=None):
     """Load and filter agro-ecological data with improved location matching"""
     try:
-        # Load agro zones data (Sheet 1)
-        df1 = pd.read_excel("Agro ecological data district dominant.xlsx", sheet_name="agro zones")
-        df1.columns = df1.columns.str.strip()
-        
-        # Load general organic farming data (Sheet 2)
-        df2 = pd.read_excel("Agro ecological data district dominant.xlsx", sheet_name="organic farming")
-        df2.columns = df2.columns.str.strip()
+        # Parsed once and shared; re-read only when the workbook changes
+        dataset = get_district_dataset()
         
         documents = []
 
         # Process location-specific data with improved matching
         if province and district:
-            # Normalize strings for better matching
-            province_norm = province.strip().lower()
-            district_norm = district.strip().lower()
-            
-            # Filter data with case-insensitive matching
-            location_data = df1[
-                (df1['Province'].str.strip().str.lower() == province_norm) &
-                (df1['District'].str.strip().str.lower() == district_norm)
-            ]
-
-            # If exact match not found, try partial matching
-            if location_data.empty:
-                location_data = df1[
-                    (df1['Province'].str.contains(province, case=False, na=False)) &
-                    (df1['District'].str.contains(district, case=False, na=False))
-                ]
-
-            if not location_data.empty:
-                for _, row in location_data.iterrows():
-                    # Create comprehensive location-specific document
-                    location_info = f"LOCATION-SPECIFIC DATA for {district}, {province}:\n\n"
-                    location_info += f"Province: {row.get('Province', 'N/A')}\n"
-                    location_info += f"District: {row.get('District', 'N/A')}\n"
-                    location_info += f"Zone: {row.get('Zones', 'N/A')}\n"
-                    location_info += f"Area Name: {row.get('Names', 'N/A')}\n"
-                    location_info += f"Climate: {row.get('Climate', 'N/A')}\n"
-                    location_info += f"Soil Types: {row.get('Soil Types', 'N/A')}\n"
-                    location_info += f"Major Crops: {row.get('Major crops', 'N/A')}\n"
-                    location_info += f"Rainfall: {row.get('Rain fall', 'N/A')}\n\n"
-
-                    # Add search-friendly variations
-                    location_info += f"Climate information for {district}: {row.get('Climate', 'N/A')}\n"
-                    location_info += f"Soil types in {district}: {row.get('Soil Types', 'N/A')}\n"
-                    location_info += f"Crops grown in {district}: {row.get('Major crops', 'N/A')}\n"
-                    location_info += f"Main crops of {district}: {row.get('Major crops', 'N/A')}\n"
-                    location_info += f"Primary crops in {district}, {province}: {row.get('Major crops', 'N/A')}\n"
-                    location_info += f"Rainfall in {district}: {row.get('Rain fall', 'N/A')}\n"
-                    location_info += f"Weather conditions in {district}: {row.get('Climate', 'N/A')}\n"
-
-                    documents.append(Document(
-                        page_content=location_info,
-                        metadata={"source": "agro_zones", "location": f"{district}, {province}"}
-                    ))
+            documents.extend(build_agro_location_documents(dataset, province, district))
 
         # Process general organic farming Q&A data
-        for _, row in df2.iterrows():
-            question = str(row.iloc[0]).strip() if len(row) > 0 and pd.notna(row.iloc[0]) else ""
-            answer = str(row.iloc[1]).strip() if len(row) > 1 and pd.notna(row.iloc[1]) else ""
-            
-            if question and answer and question.lower() != 'nan' and answer.lower() != 'nan':
-                qa_pair = f"GENERAL ORGANIC FARMING:\n\nQ: {question}\nA: {answer}\n\nKeywords: organic farming, general agriculture, farming practices"
-                documents.append(Document(
-                    page_content=qa_pair,
-                    metadata={"source": "organic_farming", "type": "general"}
-                ))
+        documents.extend(build_agro_general_documents(dataset))
 
         return documents
 
@@ -132,40 +113,24 @@ def load_agro_data(province=None, district=None):
         print(f"Error loading data: {e}")
         return []
 
-def create_vectorstore(documents):
+# Chunking used for the global index and district fallbacks (recorded in the bundle manifest)
+CHUNKING = {"chunk_size": 800, "chunk_overlap": 100, "separators": ["\n\n", "\n", ":", ".", " "]}
+
+def create_vectorstore(documents, backend=VECTOR_BACKEND):
     """Create FAISS vectorstore with improved text splitting"""
     if not documents:
         return None
         
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,
-        chunk_overlap=100,
-        separators=["\n\n", "\n", ":", ".", " "]
-    )
+    text_splitter = RecursiveCharacterTextSplitter(**CHUNKING)
     
     texts = text_splitter.split_documents(documents)
-    embeddings = OpenAIEmbeddings()
-    return FAISS.from_documents(texts, embeddings)
-
-def preload_agro_data(province, district):
-    """Preload agricultural data for the specified location"""
-    global _agro_vectorstore, _agro_location
-    
-    current_location = f"{district}, {province}"
-    
-    # Only reload if location changed
-    if _agro_location != current_location:
-        documents = load_agro_data(province, district)
-        if documents:
-            _agro_vectorstore = create_vectorstore(documents)
-            _agro_location = current_location
-            return True
-    return _agro_vectorstore is not None
+    embeddings = get_embeddings()
+    return vectorstore_from_documents(texts, embeddings, backend=backend)
 
 def create_qa_chain(vectorstore, location_context=""):
     """Create QA chain with improved location-specific focus and proper token management"""
     # SOLUTION 1: Increase max_tokens to allow complete responses
-    llm = ChatOpenAI(temperature=0, model='gpt-4-turbo', max_tokens=300)  # Increased from 350 to 600
+    llm = get_llm(max_tokens=300)  # Shared client reuses the HTTP connection pool
     
     # SOLUTION 2: Add instruction to complete sentences within token limit
     template = f"""You are an expert organic farming assistant with access to location-specific agricultural data and general organic farming knowledge. {location_context}
@@ -214,11 +179,51 @@ Answer:"""
     return RetrievalQA.from_chain_type(
         llm=llm,
         chain_type="stuff",
-        retriever=vectorstore.as_retriever(search_kwargs={"k": 5}),
+        retriever=hybrid_retriever(vectorstore, k=3),
         chain_type_kwargs={"prompt": prompt},
         return_source_documents=False
     )
 
+def get_agro_location_entry(province, district):
+    """Return the cached vectorstore and QA chain for a district, building them on a miss"""
+    key = ("district", province, district)
+    entry = location_cache.get(key)
+    if entry is not None and not is_fallback_entry(entry):
+        return entry
+
+    # Concurrent sessions asking for the same district share one build
+    return single_flight.do(key, lambda: build_agro_location_entry(province, district))
+
+def build_agro_location_entry(province, district):
+    """Build and cache the vectorstore and QA chain for a district"""
+    key = ("district", province, district)
+    entry = location_cache.peek(key)
+    if entry is not None and not is_fallback_entry(entry):
+        return entry
+
+    # Filtered view of the global index: a location switch does no index work
+    vectorstore = get_location_index("district", province, district)
+    if vectorstore is None:
+        # Without the bundle, fall back to a small in-memory index
+        documents = load_agro_data(province, district)
+        if not documents:
+            return None
+        vectorstore = create_vectorstore(documents)
+
+    location_context = f"The user has selected {district}, {province}. Prioritize location-specific data for this area."
+    if not get_district_dataset().find_location(province, district):
+        print(f"No data for district: {district}, {province}; answering general questions only")
+        location_context = (
+            f"The user has selected {district}, {province}, which has no location-specific data. "
+            "Answer general organic farming questions; for location-specific questions reply \"No data available for this specific location\"."
+        )
+    qa_chain = create_qa_chain(vectorstore, location_context)
+    return location_cache.put(key, vectorstore, qa_chain)
+
+def preload_agro_data(province, district):
+    """Preload agricultural data for the specified location"""
+    return get_agro_location_entry(province, district) is not None
+
 def post_process_response(response):
     """Post-process response to ensure sentences are complete"""
     if not response:
@@ -242,34 +247,36 @@ def post_process_response(response):
     
     return response
 
-def get_land_prep_response(query, province=None, district=None):
-    """Get response for land preparation queries with improved error handling and complete sentences"""
-    global _agro_vectorstore
+def stream_land_prep_response(query, province=None, district=None):
+    """Stream the answer for land preparation queries as the LLM generates it"""
+    if not (province and district):
+        return ResponseStream.from_text("Please select a location (province and district) first.")
     
-    # Check if vectorstore is available
-    if _agro_vectorstore is None:
-        if province and district:
-            # Try to preload data
-            if not preload_agro_data(province, district):
-                return "Unable to load data. Please check if the Excel file is available and try again."
-        else:
-            return "Please select a location (province and district) first."
+    # Climate / soil / crops / rainfall questions are answered straight from the sheet
+    answer = structured_answer(
+        query,
+        get_district_dataset().find_location(province, district),
+        f"{district}, {province}",
+        allowed=("climate", "soil_types", "major_crops", "rainfall")
+    )
+    if answer:
+        return ResponseStream.from_text(answer)
     
-    # Prepare location context
-    location_context = ""
-    if province and district:
-        location_context = f"The user has selected {district}, {province}. Prioritize location-specific data for this area."
+    # Repeated questions for this district are served from the shared answer cache
+    scope = ("district", province, district, data_version(DISTRICT_WORKBOOK))
+    cached = answer_cache.get(scope, query)
+    if cached is not None:
+        return ResponseStream.from_text(cached)
     
-    try:
-        qa_chain = create_qa_chain(_agro_vectorstore, location_context)
-        
-        # Enhanced query for better retrieval
-        enhanced_query = query
-        if province and district:
-            enhanced_query = f"{query} {district} {province}"
-        
-        result = qa_chain({"query": enhanced_query})
-        answer = result.get('result', 'Unable to find relevant information in the data.')
+    # Fetch (or build) the cached chain for this location
+    entry = get_agro_location_entry(province, district)
+    if entry is None:
+        return ResponseStream.from_text("Unable to load data. Please check if the Excel file is available and try again.")
+    
+    qa_chain = entry["qa_chain"]
+    
+    def finalize(answer):
+        answer = answer or 'Unable to find relevant information in the data.'
         
         # Post-process to ensure complete sentences
         answer = post_process_response(answer)
@@ -280,6 +287,15 @@ def get_land_prep_response(query, province=None, district=None):
                 answer = f"For {district}, {province}: {answer}"
         
         return answer
-        
-    except Exception as e:
-        return f"Error processing your query: {str(e)}"
\ No newline at end of file
+    
+    usage = {}
+    return ResponseStream(
+        stream_qa_chain(qa_chain, query, "district", scope, usage),
+        finalize,
+        on_complete=lambda answer: answer_cache.put(scope, query, answer),
+        usage=usage
+    )
+
+def get_land_prep_response(query, province=None, district=None):
+    """Get response for land preparation queries with improved error handling and complete sentences"""
+    return stream_land_prep_response(query, province, district).read()
@@ -1,20 +1,22 @@
 import os
-import pandas as pd
 import geopandas as gpd
-from shapely.geometry import Point
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from vector_backend import VECTOR_BACKEND, vectorstore_from_documents
 from langchain.chains import RetrievalQA
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
 from langchain.prompts import PromptTemplate
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
-
-# Global variables to cache vectorstore AND QA chain
-_location_vectorstore = None
-_location_qa_chain = None
-_current_location_zone = None
+from embedding_cache import get_embeddings
+from agro_data import ZONE_WORKBOOK, get_zone_dataset
+from prep_zone import build_zone_location_documents, build_zone_general_documents
+from chain_registry import get_llm
+from index_bundle import get_location_index, is_fallback_entry
+from hybrid_retriever import hybrid_retriever
+from location_cache import location_cache
+from single_flight import single_flight
+from response_stream import ResponseStream, stream_qa_chain
+from answer_cache import answer_cache, data_version
+from structured_answers import structured_answer
+from zone_index import get_zone_index, get_zone_grid
+from reverse_geocoder import reverse_geocode
 
 def load_agro_zones_geojson():
     """Load the GeoJSON file for agro-ecological zones"""
@@ -25,16 +27,9 @@ def load_agro_zones_geojson():
         return None
 
 def get_location_name(lat, lon):
-    """Get short location name from coordinates"""
+    """Get short location name from coordinates (offline gazetteer lookup)"""
     try:
-        geolocator = Nominatim(user_agent="agro_zone_app")
-        location = geolocator.reverse((lat, lon), timeout=10)
-        if location and location.raw and "address" in location.raw:
-            address = location.raw["address"]
-            return address.get("city") or address.get("town") or address.get("village") or address.get("county") or "Unknown"
-        return "Unknown"
-    except GeocoderTimedOut:
-        return "Geocoder timeout"
+        return reverse_geocode(lat, lon)
     except Exception as e:
         print(f"Error getting location name: {e}")
         return "Unknown"
@@ -42,85 +37,55 @@ def get_location_name(lat, lon):
 def find_agro_zone_from_location(lat, lon):
     """Find agro-ecological zone from coordinates"""
     try:
-        agro_zones = load_agro_zones_geojson()
-        if agro_zones is None:
+        # Constant-time raster lookup, exact polygon test only near boundaries
+        zone_lookup = get_zone_grid() or get_zone_index()
+        if zone_lookup is None:
             return None
-        
-        user_point = gpd.GeoDataFrame(geometry=[Point(lon, lat)], crs="EPSG:4326")
-        matched = gpd.sjoin(user_point, agro_zones, how="left", predicate="within")
-        
-        if not matched.empty and not pd.isna(matched.iloc[0]["zone_name"]):
-            return matched.iloc[0]["zone_name"]
-        return None
+        return zone_lookup.find_zone(lat, lon)
     except Exception as e:
         print(f"Error finding agro zone: {e}")
         return None
 
+def find_agro_zones_from_locations(points):
+    """Find agro-ecological zones for many (lat, lon) points in one call"""
+    zone_lookup = get_zone_grid() or get_zone_index()
+    if zone_lookup is None:
+        return [None] * len(points)
+    return zone_lookup.find_zones(points)
+
+def get_location_zones():
+    """Zone names location mode can detect (from the GeoJSON, not the workbook)"""
+    zone_index = get_zone_index()
+    if zone_index is None:
+        return []
+    return sorted(set(zone_index.names.tolist()))
+
+def get_agro_zone_geometry(zone_name):
+    """Return the polygon of a zone for map rendering"""
+    zone_index = get_zone_index()
+    if zone_index is None:
+        return None
+    return zone_index.get_geometry(zone_name)
+
 def load_location_zone_data(zone=None):
     """Load and filter agro-ecological data by zone (optimized version)"""
     try:
         # Debug: Check if file exists
-        if not os.path.exists("zone wise data.xlsx"):
+        if not os.path.exists(ZONE_WORKBOOK):
             print("Error: zone wise data.xlsx file not found")
             return []
             
-        # Load agro zones data with optimized pandas settings
-        df1 = pd.read_excel("zone wise data.xlsx", sheet_name="agro zones")
-        df1.columns = df1.columns.str.strip()
-        
-        print(f"Loaded {len(df1)} rows from agro zones sheet")
-        print(f"Available zones: {df1['Names'].unique().tolist()}")
-        
-        # Load general organic farming data
-        df2 = pd.read_excel("zone wise data.xlsx", sheet_name="organic farming")
-        df2.columns = df2.columns.str.strip()
+        # Parsed once and shared with the Agro Zone Wise mode
+        dataset = get_zone_dataset()
         
         documents = []
 
         # Process zone-specific data
         if zone:
-            print(f"Searching for zone: {zone}")
-            zone_norm = zone.strip().lower()
-            # Search in 'Names' column instead of 'Zones' column
-            zone_data = df1[df1['Names'].str.strip().str.lower().str.contains(zone_norm, na=False)]
-
-            if zone_data.empty:
-                zone_data = df1[df1['Names'].str.strip().str.lower() == zone_norm]
-                
-            print(f"Found {len(zone_data)} matching rows for zone: {zone}")
-
-            if not zone_data.empty:
-                for _, row in zone_data.iterrows():
-                    zone_info = f"Zone: {row.get('Zones', 'N/A')}\n"
-                    zone_info += f"Zone Name: {row.get('Names', 'N/A')}\n"
-                    zone_info += f"Climate: {row.get('Climate', 'N/A')}\n"
-                    zone_info += f"Districts: {row.get('Districts', 'N/A')}\n"
-                    zone_info += f"Soil Types: {row.get('Soil Types', 'N/A')}\n"
-                    zone_info += f"Major crops: {row.get('Major crops', 'N/A')}\n"
-                    zone_info += f"Rainfall: {row.get('Rain fall', 'N/A')}\n"
-                    
-                    # Add alternative phrasings for better matching
-                    zone_info += f"\nSoil information: {row.get('Soil Types', 'N/A')}\n"
-                    zone_info += f"Crop information: {row.get('Major crops', 'N/A')}\n"
-                    zone_info += f"Weather information: {row.get('Climate', 'N/A')}\n"
-
-                    print(f"Created document with content: {zone_info[:100]}...")
-                    documents.append(Document(
-                        page_content=zone_info,
-                        metadata={"source": "agro_zones", "zone": zone}
-                    ))
+            documents.extend(build_zone_location_documents(dataset, zone))
 
         # Process general organic farming Q&A data
-        for _, row in df2.iterrows():
-            question = str(row.iloc[0]).strip() if len(row) > 0 and pd.notna(row.iloc[0]) else ""
-            answer = str(row.iloc[1]).strip() if len(row) > 1 and pd.notna(row.iloc[1]) else ""
-            
-            if question and answer and question.lower() != 'nan' and answer.lower() != 'nan':
-                qa_pair = f"Q: {question}\nA: {answer}"
-                documents.append(Document(
-                    page_content=qa_pair,
-                    metadata={"source": "organic_farming", "type": "general"}
-                ))
+        documents.extend(build_zone_general_documents(dataset))
 
         print(f"Total documents created: {len(documents)}")
         return documents
@@ -144,9 +109,9 @@ def create_location_vectorstore(documents):
         texts = text_splitter.split_documents(documents)
         print(f"Created {len(texts)} text chunks for vectorstore")
         
-        embeddings = OpenAIEmbeddings()
-        vectorstore = FAISS.from_documents(texts, embeddings)
-        print("Successfully created FAISS vectorstore")
+        embeddings = get_embeddings()
+        vectorstore = vectorstore_from_documents(texts, embeddings, backend=VECTOR_BACKEND)
+        print("Successfully created vectorstore")
         return vectorstore
     except Exception as e:
         print(f"Error creating vectorstore: {e}")
@@ -155,14 +120,10 @@ def create_location_vectorstore(documents):
 def create_location_qa_chain(vectorstore):
     """Create QA chain for location-based zone queries (optimized)"""
     try:
-        llm = ChatOpenAI(
-            temperature=0, 
-            model='gpt-4-turbo', 
-            max_tokens=300,
-            request_timeout=30  # Add timeout
-        )
+        llm = get_llm(max_tokens=300, request_timeout=30)
         
         template = """You are an agricultural assistant specialized in organic farming. Answer questions ONLY about agro-ecological zones and organic farming based on the provided data.
+The user is in {city_name}, which lies in the {zone} agro-ecological zone.
 
 Context: {context}
 Question: {question}
@@ -172,16 +133,16 @@ INSTRUCTIONS:
 1. **Zone-specific queries** (climate, soil types, crops, rainfall, districts for a specific zone):
    - Use ONLY the zone data from the context
    - ALWAYS include both the city/location name AND zone name in your answer
-   - Format: "In [City Name] (located in [Zone Name]), the soil types are..." 
-   - If data shows "N/A" or is missing, state: "This information is not available in the data for [City Name] in [Zone Name]"
+   - Format: "In {city_name} (located in [Zone Name]), the soil types are..." 
+   - If data shows "N/A" or is missing, state: "This information is not available in the data for {city_name} in [Zone Name]"
 
 2. **General organic farming queries** (definitions, practices, methods):
-   - Even for general questions, contextualize with location: "For your location in [City Name] ([Zone Name]), [general answer]"
+   - Even for general questions, contextualize with location: "For your location in {city_name} ([Zone Name]), [general answer]"
    - If no zone context available, provide the general answer from organic farming data
    - Always try to mention both city and zone when possible
 
 3. **Crop suitability questions**:
-   - Always mention both location identifiers: "In [City Name] ([Zone Name]), [crop name] is/isn't suitable because..."
+   - Always mention both location identifiers: "In {city_name} ([Zone Name]), [crop name] is/isn't suitable because..."
    - Check if the crop is listed in "Major crops" for the zone
    - If not listed, assess suitability based on available climate/soil data only
 
@@ -199,7 +160,7 @@ INSTRUCTIONS:
    - For non-agricultural questions, respond: "I can only help with questions about agro-ecological zones and organic farming."
 
 6. **Data availability**:
-   - If no relevant data found: "This information is not available in the data for [City Name] in [Zone Name]"
+   - If no relevant data found: "This information is not available in the data for {city_name} in [Zone Name]"
    - If zone not found: "No data available for this specific location"
 
 7.  **Response format**:
@@ -213,15 +174,13 @@ INSTRUCTIONS:
 
 Answer:"""
         
-        prompt = PromptTemplate(template=template, input_variables=["context", "question"])
+        # The city and zone are prompt variables filled per request; retrieval sees only the question
+        prompt = PromptTemplate(template=template, input_variables=["context", "question", "city_name", "zone"])
         
         qa_chain = RetrievalQA.from_chain_type(
             llm=llm,
             chain_type="stuff",
-            retriever=vectorstore.as_retriever(
-                search_type="similarity",
-                search_kwargs={"k": 5}
-            ),
+            retriever=hybrid_retriever(vectorstore, k=3),
             chain_type_kwargs={"prompt": prompt},
             return_source_documents=False
         )
@@ -235,13 +194,31 @@ Answer:"""
 
 def preload_location_zone_data(zone):
     """Preload agricultural data AND QA chain for the location-detected zone"""
-    global _location_vectorstore, _location_qa_chain, _current_location_zone
+    key = ("location", zone)
+    
+    # Only build if this zone is not already cached (or cached on a superseded local index)
+    entry = location_cache.get(key)
+    if entry is not None and not is_fallback_entry(entry):
+        print(f"Data already loaded for zone: {zone}")
+        return True
+    
+    # Concurrent sessions in the same zone share one build
+    return bool(single_flight.do(key, lambda: build_location_zone_data(zone)))
+
+def build_location_zone_data(zone):
+    """Build and cache the vectorstore and QA chain for a location-detected zone"""
+    key = ("location", zone)
     
     try:
-        # Only reload if zone has changed
-        if _current_location_zone != zone or _location_vectorstore is None or _location_qa_chain is None:
-            print(f"Preloading data for zone: {zone}")
-            
+        entry = location_cache.peek(key)
+        if entry is not None and not is_fallback_entry(entry):
+            return True
+        
+        print(f"Preloading data for zone: {zone}")
+        
+        # Filtered view of the global index when the bundle is available
+        vectorstore = get_location_index("zone", zone)
+        if vectorstore is None:
             # Load documents
             documents = load_location_zone_data(zone)
             if not documents:
@@ -249,67 +226,82 @@ def preload_location_zone_data(zone):
                 return False
             
             # Create vectorstore
-            _location_vectorstore = create_location_vectorstore(documents)
-            if _location_vectorstore is None:
-                print("Failed to create vectorstore")
-                return False
-            
-            # Create QA chain
-            _location_qa_chain = create_location_qa_chain(_location_vectorstore)
-            if _location_qa_chain is None:
-                print("Failed to create QA chain")
-                return False
-            
-            _current_location_zone = zone
-            print(f"Successfully preloaded all components for zone: {zone}")
-            return True
-        else:
-            print(f"Data already loaded for zone: {zone}")
-            return True
+            vectorstore = create_location_vectorstore(documents)
+        if vectorstore is None:
+            print("Failed to create vectorstore")
+            return False
+        
+        # Create QA chain
+        qa_chain = create_location_qa_chain(vectorstore)
+        if qa_chain is None:
+            print("Failed to create QA chain")
+            return False
+        
+        location_cache.put(key, vectorstore, qa_chain)
+        print(f"Successfully preloaded all components for zone: {zone}")
+        return True
             
     except Exception as e:
         print(f"Error in preload_location_zone_data: {e}")
         return False
 
-def get_location_zone_response(query, zone=None, city_name="Unknown"):
-    """Get response for location-based zone queries (optimized for speed)"""
-    global _location_vectorstore, _location_qa_chain, _current_location_zone
-    
+def stream_location_zone_response(query, zone=None, city_name="Unknown"):
+    """Stream the answer for location-based zone queries as the LLM generates it"""
     try:
         # Debug: Check if zone is provided
         if not zone:
-            return "Unable to detect your agro-ecological zone. Please ensure location access is enabled."
+            return ResponseStream.from_text("Unable to detect your agro-ecological zone. Please ensure location access is enabled.")
+        
+        # Climate / soil / crops / rainfall / districts questions are answered straight from the sheet
+        answer = structured_answer(query, get_zone_dataset().find_zone(zone), f"{city_name} ({zone})")
+        if answer:
+            return ResponseStream.from_text(answer)
+        
+        # Repeated questions from this place are served from the shared answer cache
+        scope = ("location", zone, city_name, data_version(ZONE_WORKBOOK))
+        cached = answer_cache.get(scope, query)
+        if cached is not None:
+            return ResponseStream.from_text(cached)
         
         # Check if data is preloaded
-        if (_current_location_zone != zone or 
-            _location_vectorstore is None or 
-            _location_qa_chain is None):
+        entry = location_cache.get(("location", zone))
+        if entry is None or is_fallback_entry(entry):
             print(f"Data not preloaded for zone: {zone}. Attempting to preload...")
             if not preload_location_zone_data(zone):
-                return f"Unable to load data for zone: {zone}. Please check if the 'zone wise data.xlsx' file is available."
+                return ResponseStream.from_text(f"Unable to load data for zone: {zone}. Please check if the 'zone wise data.xlsx' file is available.")
+            entry = location_cache.get(("location", zone))
         
         print(f"Processing query: '{query}' for zone: {zone} in city: {city_name}")
         
-        # Add zone and city context to the query to help with retrieval
-        contextual_query = f"In {city_name} located in {zone} zone: {query}"
-        
-        # Use the cached QA chain for fast response
-        result = _location_qa_chain({"query": contextual_query})
-        answer = result.get('result', 'Unable to find relevant information.')
-        
-        # Ensure both city and zone names are mentioned in response if not already included
-        if city_name.lower() not in answer.lower() and zone.lower() not in answer.lower():
-            answer = f"For {city_name} in {zone}: {answer}"
-        elif city_name.lower() not in answer.lower():
-            answer = f"In {city_name} ({zone}): {answer}"
-        elif zone.lower() not in answer.lower():
-            answer = f"For your location in {city_name} ({zone}): {answer}"
+        def finalize(answer):
+            answer = answer or 'Unable to find relevant information.'
+            
+            # Ensure both city and zone names are mentioned in response if not already included
+            if city_name.lower() not in answer.lower() and zone.lower() not in answer.lower():
+                answer = f"For {city_name} in {zone}: {answer}"
+            elif city_name.lower() not in answer.lower():
+                answer = f"In {city_name} ({zone}): {answer}"
+            elif zone.lower() not in answer.lower():
+                answer = f"For your location in {city_name} ({zone}): {answer}"
+            
+            print(f"Generated answer: {answer[:100]}...")
+            return answer
         
-        print(f"Generated answer: {answer[:100]}...")
-        return answer
+        # Stream from the cached QA chain
+        usage = {}
+        return ResponseStream(
+            stream_qa_chain(entry["qa_chain"], query, "location", scope, usage, {"city_name": city_name, "zone": zone}),
+            finalize,
+            on_complete=lambda answer: answer_cache.put(scope, query, answer),
+            usage=usage
+        )
         
     except Exception as e:
         error_msg = f"Error processing your query: {str(e)}"
         print(error_msg)
 
-        return error_msg
\ No newline at end of file
+        return ResponseStream.from_text(error_msg)
+
+def get_location_zone_response(query, zone=None, city_name="Unknown"):
+    """Get response for location-based zone queries (optimized for speed)"""
+    return stream_location_zone_response(query, zone, city_name).read()
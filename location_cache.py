@@ -0,0 +1,78 @@
+import os
+import threading
+from collections import OrderedDict
+
+class LocationCache:
+    """Thread-safe, size-bounded LRU of per-location vectorstores and QA chains.
+
+    Keys are tuples such as ("district", province, district), ("zone", zone)
+    or ("location", zone), so sessions in different places share the process
+    without evicting each other on every question.
+    """
+
+    def __init__(self, max_size=32):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached entry for key (marking it recently used) or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def peek(self, key):
+        """Return the cached entry for key without touching counters or recency"""
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key, vectorstore, qa_chain):
+        """Store the vectorstore and chain for key, evicting the least recently used"""
+        entry = {"vectorstore": vectorstore, "qa_chain": qa_chain}
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self.evictions += 1
+                print(f"Evicted cached retriever for {evicted_key}")
+        return entry
+
+    def discard(self, predicate):
+        """Drop every entry for which predicate(entry) is true; returns how many were dropped"""
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if predicate(entry)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current size"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+# Process-wide cache shared by every Streamlit session
+location_cache = LocationCache(max_size=int(os.getenv("LOCATION_CACHE_SIZE", "32")))
+
+def get_location_cache_stats():
+    """Return counters for the shared per-location cache"""
+    return location_cache.stats()
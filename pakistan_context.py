@@ -1,106 +1,72 @@
 import os
-import pandas as pd
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from vector_backend import vectorstore_from_documents
 from langchain.chains import RetrievalQA
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 from langchain.prompts import PromptTemplate
-import re
+from embedding_cache import get_embeddings
+from agro_data import DISTRICT_WORKBOOK, get_district_dataset
+from land_prep import build_agro_record_text
+from crop_index import CropIndex, KNOWN_CROPS
+from query_matcher import QueryMatcher
+from chain_registry import get_llm, get_chain, invalidate_chain
+from response_stream import ResponseStream, stream_qa_chain
+from answer_cache import answer_cache, data_version
+from single_flight import single_flight
+from hybrid_retriever import hybrid_retriever
+from index_bundle import get_location_index, is_bundle_loaded
 
 # Global variables to cache vectorstore and raw data
 _pakistan_vectorstore = None
+_pakistan_from_bundle = False
 _pakistan_data_loaded = False
 _raw_agro_data = None
+_crop_index = None
+
+# Query classifier compiled once; rebuilt with the loaded crop vocabulary
+_query_matcher = QueryMatcher(KNOWN_CROPS)
 
 def load_pakistan_context_data():
     """Load all agro-ecological data for Pakistan-wide queries"""
-    global _raw_agro_data
+    global _raw_agro_data, _crop_index, _query_matcher
     
     try:
         # Debug: Check if file exists
-        if not os.path.exists("Agro ecological data district dominant.xlsx"):
+        if not os.path.exists(DISTRICT_WORKBOOK):
             print("Error: Agro ecological data district dominant.xlsx file not found")
             return []
             
-        # Load agro zones data (Sheet 1)
-        df1 = pd.read_excel("Agro ecological data district dominant.xlsx", sheet_name="agro zones")
-        df1.columns = df1.columns.str.strip()
-        
-        # Store raw data for direct crop queries
-        _raw_agro_data = df1
-        
-        print(f"Loaded {len(df1)} rows from agro zones sheet")
-        
-        # Load general organic farming data (Sheet 2)
-        df2 = pd.read_excel("Agro ecological data district dominant.xlsx", sheet_name="organic farming")
-        df2.columns = df2.columns.str.strip()
+        # Parsed once and shared with the District Wise mode
+        dataset = get_district_dataset()
         
-        print(f"Loaded {len(df2)} rows from organic farming sheet")
+        # Store raw records for direct crop queries
+        _raw_agro_data = dataset.records
+        _crop_index = CropIndex(dataset.records)
+        _query_matcher = QueryMatcher(_crop_index.vocabulary)
         
         documents = []
 
-        # Process all agro-ecological zones data
-        for _, row in df1.iterrows():
-            # Create comprehensive document for each zone/district
-            zone_info = f"PAKISTAN AGRO-ECOLOGICAL DATA:\n\n"
-            zone_info += f"Zone: {row.get('Zones', 'N/A')}\n"
-            zone_info += f"Zone Name: {row.get('Names', 'N/A')}\n"
-            zone_info += f"Province: {row.get('Province', 'N/A')}\n"
-            zone_info += f"District: {row.get('District', 'N/A')}\n"
-            zone_info += f"Climate: {row.get('Climate', 'N/A')}\n"
-            zone_info += f"Soil Types: {row.get('Soil Types', 'N/A')}\n"
-            zone_info += f"Major Crops: {row.get('Major crops', 'N/A')}\n"
-            zone_info += f"Rainfall: {row.get('Rain fall', 'N/A')}\n\n"
-            
-            # Add search-friendly variations for crop queries
-            major_crops = str(row.get('Major crops', '')).lower()
-            district = str(row.get('District', 'N/A'))
-            province = str(row.get('Province', 'N/A'))
-            zone_name = str(row.get('Names', 'N/A'))
-            
-            zone_info += f"Crop cultivation information:\n"
-            zone_info += f"Crops grown in {district}: {row.get('Major crops', 'N/A')}\n"
-            zone_info += f"Agricultural crops in {district}, {province}: {row.get('Major crops', 'N/A')}\n"
-            zone_info += f"Crops suitable for {zone_name}: {row.get('Major crops', 'N/A')}\n"
-            
-            # Add specific crop mentions for better search
-            if major_crops and major_crops != 'n/a':
-                crops_list = [crop.strip() for crop in major_crops.split(',')]
-                for crop in crops_list:
-                    if crop and len(crop) > 2:  # Avoid empty or very short strings
-                        zone_info += f"{crop.title()} cultivation: {district}, {province} - {zone_name}\n"
-                        zone_info += f"Where to grow {crop}: {district} district in {province}\n"
-            
-            zone_info += f"\nLocation details:\n"
-            zone_info += f"Climate conditions in {district}: {row.get('Climate', 'N/A')}\n"
-            zone_info += f"Soil information for {district}: {row.get('Soil Types', 'N/A')}\n"
-            zone_info += f"Rainfall pattern in {district}: {row.get('Rain fall', 'N/A')}\n"
-
+        # Same section labels as the global index, so one prompt fits both
+        for record in dataset.records:
             documents.append(Document(
-                page_content=zone_info,
+                page_content=build_agro_record_text(record),
                 metadata={
                     "source": "pakistan_agro_zones", 
-                    "zone": row.get('Names', 'N/A'),
-                    "district": district,
-                    "province": province,
-                    "crops": row.get('Major crops', 'N/A')
+                    "zone": record.names,
+                    "district": record.district,
+                    "province": record.province,
+                    "crops": record.major_crops
                 }
             ))
 
         # Process general organic farming Q&A data
-        for _, row in df2.iterrows():
-            question = str(row.iloc[0]).strip() if len(row) > 0 and pd.notna(row.iloc[0]) else ""
-            answer = str(row.iloc[1]).strip() if len(row) > 1 and pd.notna(row.iloc[1]) else ""
+        for question, answer in dataset.qa_pairs:
+            qa_pair = f"GENERAL ORGANIC FARMING:\n\nQ: {question}\nA: {answer}"
             
-            if question and answer and question.lower() != 'nan' and answer.lower() != 'nan':
-                qa_pair = f"GENERAL ORGANIC FARMING KNOWLEDGE:\n\nQ: {question}\nA: {answer}\n\n"
-                qa_pair += f"Keywords: organic farming, sustainable agriculture, farming practices, Pakistan agriculture"
-                
-                documents.append(Document(
-                    page_content=qa_pair,
-                    metadata={"source": "organic_farming", "type": "general"}
-                ))
+            documents.append(Document(
+                page_content=qa_pair,
+                metadata={"source": "organic_farming", "type": "general"}
+            ))
 
         print(f"Total documents created for Pakistan context: {len(documents)}")
         return documents
@@ -109,134 +75,53 @@ def load_pakistan_context_data():
         print(f"Error loading Pakistan context data: {e}")
         return []
 
+def analyse_query(query):
+    """Classify the query into every intent and extract crops in one regex pass"""
+    return _query_matcher.analyse(query)
+
 def is_agricultural_query(query):
     """Check if query is related to agriculture/farming"""
-    agricultural_keywords = [
-        # Crops and farming
-        'crop', 'crops', 'farming', 'agriculture', 'cultivation', 'grow', 'growing',
-        'plant', 'planting', 'harvest', 'harvesting', 'seed', 'seeds', 'organic',
-        
-        # Soil and land
-        'soil', 'land', 'earth', 'field', 'farm', 'irrigation', 'fertilizer',
-        'compost', 'manure', 'pesticide', 'herbicide',
-        
-        # Weather and climate
-        'climate', 'weather', 'rainfall', 'rain', 'temperature', 'season', 'seasonal',
-        'monsoon', 'drought', 'water',
-        
-        # Specific crops (common ones)
-        'wheat', 'rice', 'cotton', 'sugarcane', 'maize', 'corn', 'mango', 'mangoes',
-        'citrus', 'banana', 'apple', 'grapes', 'dates', 'onion', 'potato', 'tomato',
-        'chili', 'garlic', 'ginger', 'turmeric', 'vegetables', 'fruits',
-        
-        # Locations (Pakistan geography)
-        'pakistan', 'province', 'district', 'zone', 'punjab', 'sindh', 'balochistan',
-        'khyber pakhtunkhwa', 'kpk', 'karachi', 'lahore', 'islamabad', 'faisalabad',
-        
-        # Agricultural practices
-        'sowing', 'reaping', 'tillage', 'plowing', 'rotation', 'intercropping',
-        'livestock', 'dairy', 'poultry', 'cattle', 'buffalo', 'goat', 'sheep'
-    ]
-    
-    query_lower = query.lower()
-    
-    # Check if query contains any agricultural keywords
-    return any(keyword in query_lower for keyword in agricultural_keywords)
+    return analyse_query(query).agricultural
 
 def is_general_query(query):
     """Check if query is asking for general information that should be specific"""
-    general_keywords = [
-        'soil types', 'soil type', 'climate', 'rainfall', 'rain fall', 
-        'weather', 'temperature', 'what are the', 'list all', 
-        'all soil', 'all climate', 'all rainfall'
-    ]
-    
-    query_lower = query.lower()
-    
-    # Check if it's a general query
-    for keyword in general_keywords:
-        if keyword in query_lower:
-            # Allow only if it mentions specific districts or zones
-            # Province-level queries are still considered too general
-            if any(spec in query_lower for spec in ['district', 'zone']):
-                return False  # It's specific enough
-            else:
-                return True   # It's too general (includes province-level)
-    
-    return False
+    # Province-level queries are still considered too general
+    return analyse_query(query).general
 
 def is_crop_location_query(query):
     """Check if query is asking where to grow specific crops"""
-    crop_location_keywords = [
-        'where can i grow', 'where to grow', 'which district', 'which province',
-        'districts for', 'areas for', 'suitable for', 'grow in', 'cultivation of',
-        'districts where', 'provinces where'
-    ]
-    
-    query_lower = query.lower()
-    return any(keyword in query_lower for keyword in crop_location_keywords)
+    return analyse_query(query).crop_location
 
 def search_crop_in_all_districts(crop_name):
-    """Search for a specific crop in all districts using raw data"""
-    global _raw_agro_data
-    
-    if _raw_agro_data is None:
+    """Search for a specific crop in all districts using the crop index"""
+    return search_crops_in_all_districts([crop_name])
+
+def search_crops_in_all_districts(crop_names):
+    """Return districts listing every one of the given crops among their major crops"""
+    if _raw_agro_data is None or _crop_index is None:
         return []
     
-    crop_name = crop_name.lower()
     matching_districts = []
-    
-    for _, row in _raw_agro_data.iterrows():
-        major_crops = str(row.get('Major crops', '')).lower()
-        if crop_name in major_crops:
-            district = str(row.get('District', 'N/A'))
-            province = str(row.get('Province', 'N/A'))
-            zone = str(row.get('Names', 'N/A'))
-            
-            matching_districts.append({
-                'district': district,
-                'province': province,
-                'zone': zone,
-                'crops': row.get('Major crops', 'N/A'),
-                'climate': row.get('Climate', 'N/A'),
-                'soil': row.get('Soil Types', 'N/A')
-            })
+    for row_id in sorted(_crop_index.lookup_all(crop_names)):
+        record = _raw_agro_data[row_id]
+        matching_districts.append({
+            'district': record.district,
+            'province': record.province,
+            'zone': record.names,
+            'crops': record.major_crops,
+            'climate': record.climate,
+            'soil': record.soil_types
+        })
     
     return matching_districts
 
+def extract_crops_from_query(query):
+    """Extract all known crop names mentioned in the query"""
+    return analyse_query(query).crops
+
 def extract_crop_from_query(query):
     """Extract crop name from location query"""
-    # Common patterns for crop queries
-    patterns = [
-        r'where can i grow (\w+)',
-        r'where to grow (\w+)',
-        r'districts for (\w+)',
-        r'areas for (\w+)',
-        r'cultivation of (\w+)',
-        r'grow (\w+) in',
-        r'suitable for (\w+)',
-        r'(\w+) cultivation'
-    ]
-    
-    query_lower = query.lower()
-    
-    for pattern in patterns:
-        match = re.search(pattern, query_lower)
-        if match:
-            return match.group(1)
-    
-    # If no pattern matches, try to find crop names in the query
-    common_crops = [
-        'wheat', 'rice', 'cotton', 'sugarcane', 'maize', 'mango', 'mangoes',
-        'citrus', 'banana', 'apple', 'grapes', 'dates', 'onion', 'potato',
-        'tomato', 'chili', 'garlic', 'ginger', 'turmeric'
-    ]
-    
-    for crop in common_crops:
-        if crop in query_lower:
-            return crop
-    
-    return None
+    return analyse_query(query).crop
 
 def create_pakistan_vectorstore(documents):
     """Create FAISS vectorstore for Pakistan-wide queries"""
@@ -250,18 +135,35 @@ def create_pakistan_vectorstore(documents):
     )
     
     texts = text_splitter.split_documents(documents)
-    embeddings = OpenAIEmbeddings()
-    return FAISS.from_documents(texts, embeddings)
+    embeddings = get_embeddings()
+    return vectorstore_from_documents(texts, embeddings)
+
+def set_pakistan_vectorstore(vectorstore, from_bundle):
+    """Swap in a new Pakistan vectorstore and drop the chain bound to the old one"""
+    global _pakistan_vectorstore, _pakistan_from_bundle
+    _pakistan_vectorstore = vectorstore
+    _pakistan_from_bundle = from_bundle
+    invalidate_chain(("pakistan",))
 
 def preload_pakistan_context_data():
     """Preload all Pakistan agricultural data"""
-    global _pakistan_vectorstore, _pakistan_data_loaded
+    if _pakistan_data_loaded:
+        return _pakistan_vectorstore is not None
+    
+    # Concurrent sessions share one build; failures back off instead of stampeding
+    return bool(single_flight.do(("pakistan",), build_pakistan_context_data))
+
+def build_pakistan_context_data():
+    """Load the records and build the Pakistan-wide vectorstore"""
+    global _pakistan_data_loaded
     
     if not _pakistan_data_loaded:
         print("Loading Pakistan context data...")
         documents = load_pakistan_context_data()
         if documents:
-            _pakistan_vectorstore = create_pakistan_vectorstore(documents)
+            # District rows and Q&A from the global index; built locally only without the bundle
+            bundle_view = get_location_index("pakistan")
+            set_pakistan_vectorstore(bundle_view or create_pakistan_vectorstore(documents), bundle_view is not None)
             _pakistan_data_loaded = True
             print("Pakistan context data loaded successfully!")
             return True
@@ -296,7 +198,7 @@ def post_process_pakistan_response(response):
 def create_pakistan_qa_chain(vectorstore):
     """Create QA chain for Pakistan-wide queries with improved token management"""
     # SOLUTION 1: Increased token limit from 400 to 650
-    llm = ChatOpenAI(temperature=0, model='gpt-4-turbo', max_tokens=650)
+    llm = get_llm(max_tokens=650)
     
     # SOLUTION 2: Added instruction for complete sentences
     template = """You are an expert agricultural consultant with comprehensive knowledge of Pakistan's agro-ecological zones and organic farming. You have access to data covering all provinces, districts, and agro-ecological zones of Pakistan.
@@ -313,7 +215,7 @@ INSTRUCTIONS:
    - If YES: Proceed with the answer using the instructions below
 
 2. **Crop location queries** (e.g., "where can I grow mangoes", "which districts are suitable for wheat"):
-   - Search through ALL available district and zone data
+   - Search through ALL "LOCATION-SPECIFIC DATA" sections in the context
    - List ALL districts/provinces where the crop is mentioned in "Major crops"
    - Format: "You can grow [crop] in the following locations: District1 (Province1), District2 (Province2)..."
    - If crop is not found in any major crops list, state data unavailability
@@ -324,12 +226,12 @@ INSTRUCTIONS:
    - Rank or categorize based on the data provided
 
 4. **Zone-specific information** (climate, soil, crops for specific zones):
-   - Use the agro-ecological zone data
+   - Use the "LOCATION-SPECIFIC DATA" sections whose Zone or Area Name matches
    - Include zone name, provinces, and districts covered
    - Provide comprehensive information about climate, soil, and crops
 
 5. **General organic farming queries**:
-   - Use the "GENERAL ORGANIC FARMING KNOWLEDGE" data
+   - Use the "GENERAL ORGANIC FARMING" sections (Q&A pairs)
    - Provide detailed, informative answers
 
 6. **Multi-location queries** (e.g., "climate of northern districts"):
@@ -361,42 +263,54 @@ Answer:"""
     return RetrievalQA.from_chain_type(
         llm=llm,
         chain_type="stuff",
-        retriever=vectorstore.as_retriever(search_kwargs={"k": 12}),  # Retrieve more documents for comprehensive answers
+        retriever=hybrid_retriever(vectorstore, k=6),  # Keyword + dense ranks find the named districts and crops
         chain_type_kwargs={"prompt": prompt},
         return_source_documents=False
     )
 
-def get_pakistan_context_response(query):
-    """Get response for Pakistan-wide queries with improved sentence completion"""
-    global _pakistan_vectorstore
-    
+def stream_pakistan_context_response(query):
+    """Stream the answer for Pakistan-wide queries as the LLM generates it"""
     # Check if data is loaded
     if not _pakistan_data_loaded:
         if not preload_pakistan_context_data():
-            return "Unable to load Pakistan agricultural data. Please check if the 'agro ecological data.xlsx' file is available."
+            return ResponseStream.from_text("Unable to load Pakistan agricultural data. Please check if the 'agro ecological data.xlsx' file is available.")
+    
+    # Move from a local fallback index to the global one once the bundle has loaded
+    if not _pakistan_from_bundle and is_bundle_loaded():
+        bundle_view = get_location_index("pakistan")
+        if bundle_view is not None:
+            set_pakistan_vectorstore(bundle_view, True)
     
     if _pakistan_vectorstore is None:
-        return "Pakistan context data is not available. Please try again."
+        return ResponseStream.from_text("Pakistan context data is not available. Please try again.")
     
     try:
+        # Classify once: intents and crop entities come from a single regex scan
+        analysis = analyse_query(query)
+        
         # FIRST CHECK: Is this an agricultural query?
-        if not is_agricultural_query(query):
-            return "I can only provide information about agriculture, farming, crops, soil, climate, and Pakistan's agro-ecological zones. Please ask questions related to these topics."
+        if not analysis.agricultural:
+            return ResponseStream.from_text("I can only provide information about agriculture, farming, crops, soil, climate, and Pakistan's agro-ecological zones. Please ask questions related to these topics.")
         
         # Check if it's a general query that should be specific
-        if is_general_query(query):
-            return "To provide you with precise and specific information, please specify:\n\n" \
+        if analysis.general:
+            return ResponseStream.from_text("To provide you with precise and specific information, please specify:\n\n" \
                    "• A specific agro-ecological zone (e.g., 'soil types in Zone III - Sandy Desert')\n" \
                    "• A specific district (e.g., 'climate in Lahore district')\n\n" \
-                   "Province-level queries are too broad. Please ask about specific districts or agro-ecological zones for detailed and accurate information."
+                   "Province-level queries are too broad. Please ask about specific districts or agro-ecological zones for detailed and accurate information.")
         
         # Check if it's a crop location query
-        if is_crop_location_query(query):
-            crop_name = extract_crop_from_query(query)
+        if analysis.crop_location:
+            crop_names = analysis.crops
+            if len(crop_names) > 1:
+                # Multi-crop question: intersect the crop postings
+                crop_name = " and ".join(crop_names)
+                matching_districts = search_crops_in_all_districts(crop_names)
+            else:
+                crop_name = analysis.crop
+                matching_districts = search_crop_in_all_districts(crop_name) if crop_name else None
+            
             if crop_name:
-                # Search directly in raw data for comprehensive results
-                matching_districts = search_crop_in_all_districts(crop_name)
-                
                 if matching_districts:
                     response = f"You can grow {crop_name} in the following locations:\n\n"
                     
@@ -417,21 +331,41 @@ def get_pakistan_context_response(query):
                     response += f"\nTotal districts where {crop_name} can be grown: {len(matching_districts)}\n"
                     response += f"\nFor detailed climate, soil, and other agricultural information about any specific district, please ask about that district specifically."
                     
-                    return response
+                    return ResponseStream.from_text(response)
                 else:
-                    return f"Based on the available data, {crop_name} is not listed as a major crop in any of the covered districts. The data might not be comprehensive for all crops, or this crop might be grown as a minor crop in some areas."
+                    return ResponseStream.from_text(f"Based on the available data, {crop_name} is not listed as a major crop in any of the covered districts. The data might not be comprehensive for all crops, or this crop might be grown as a minor crop in some areas.")
+        
+        # Repeated questions are served from the shared answer cache
+        scope = ("pakistan", data_version(DISTRICT_WORKBOOK))
+        cached = answer_cache.get(scope, query)
+        if cached is not None:
+            return ResponseStream.from_text(cached)
         
         # For other queries, use the QA chain
-        qa_chain = create_pakistan_qa_chain(_pakistan_vectorstore)
+        qa_chain = get_chain(("pakistan",), lambda: create_pakistan_qa_chain(_pakistan_vectorstore))
         print(f"Pakistan context query: {query}")
-        result = qa_chain({"query": query})
-        answer = result.get('result', 'Unable to find relevant information in the Pakistan agricultural data.')
         
-        # SOLUTION 3: Post-process to ensure complete sentences
-        answer = post_process_pakistan_response(answer)
+        def finalize(answer):
+            answer = answer or 'Unable to find relevant information in the Pakistan agricultural data.'
+            
+            # SOLUTION 3: Post-process to ensure complete sentences
+            answer = post_process_pakistan_response(answer)
+            
+            print(f"Pakistan context answer: {answer[:200]}...")
+            return answer
         
-        print(f"Pakistan context answer: {answer[:200]}...")
-        return answer
+        usage = {}
+        return ResponseStream(
+            stream_qa_chain(qa_chain, query, "pakistan", scope, usage),
+            finalize,
+            error_prefix="Error processing your Pakistan context query",
+            on_complete=lambda answer: answer_cache.put(scope, query, answer),
+            usage=usage
+        )
         
     except Exception as e:
-        return f"Error processing your Pakistan context query: {str(e)}"
\ No newline at end of file
+        return ResponseStream.from_text(f"Error processing your Pakistan context query: {str(e)}")
+
+def get_pakistan_context_response(query):
+    """Get response for Pakistan-wide queries with improved sentence completion"""
+    return stream_pakistan_context_response(query).read()
@@ -1,11 +1,19 @@
 import os
-import pandas as pd
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from vector_backend import VECTOR_BACKEND, vectorstore_from_documents
 from langchain.chains import RetrievalQA
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 from langchain.prompts import PromptTemplate
+from embedding_cache import get_embeddings
+from agro_data import ZONE_WORKBOOK, get_zone_dataset
+from chain_registry import get_llm
+from index_bundle import get_location_index, is_fallback_entry
+from hybrid_retriever import hybrid_retriever
+from location_cache import location_cache
+from single_flight import single_flight
+from response_stream import ResponseStream, stream_qa_chain
+from answer_cache import answer_cache, data_version
+from structured_answers import structured_answer
 
 # Agro-ecological zones list
 AGRO_ZONES = [
@@ -21,79 +29,65 @@ AGRO_ZONES = [
     "Sulaiman Piedmont"
 ]
 
-# Global variables to cache vectorstore
-_zone_vectorstore = None
-_current_zone = None
-
 def get_agro_zones():
     """Return the list of agro-ecological zones"""
     return AGRO_ZONES
 
+def build_zone_record_text(record):
+    """Render one agro zones row as a zone-specific document"""
+    zone_info = f"Zone: {record.zones}\n"
+    zone_info += f"Zone Name: {record.names}\n"
+    zone_info += f"Climate: {record.climate}\n"
+    zone_info += f"Districts: {record.districts}\n"
+    zone_info += f"Soil Types: {record.soil_types}\n"
+    zone_info += f"Major crops: {record.major_crops}\n"
+    zone_info += f"Rainfall: {record.rainfall}\n"
+    return zone_info
+
+def build_zone_location_documents(dataset, zone):
+    """Build zone-specific documents for one zone from the agro zones sheet"""
+    print(f"Searching for zone: {zone}")
+    zone_data = dataset.find_zone(zone)
+    print(f"Found {len(zone_data)} matching rows for zone: {zone}")
+
+    return [
+        Document(
+            page_content=build_zone_record_text(record),
+            metadata={"source": "agro_zones", "zone": zone}
+        )
+        for record in zone_data
+    ]
+
+def build_zone_general_documents(dataset):
+    """Build general organic farming Q&A documents from the organic farming sheet"""
+    return [
+        Document(
+            page_content=f"Q: {question}\nA: {answer}",
+            metadata={"source": "organic_farming", "type": "general"}
+        )
+        for question, answer in dataset.qa_pairs
+    ]
+
 def load_zone_data(zone=None):
     """Load and filter agro-ecological data by zone"""
     try:
         # Debug: Check if file exists
-        if not os.path.exists("zone wise data.xlsx"):
+        if not os.path.exists(ZONE_WORKBOOK):
             print("Error: zone wise data.xlsx file not found")
             return []
             
-        # Load agro zones data
-        df1 = pd.read_excel("zone wise data.xlsx", sheet_name="agro zones")
-        df1.columns = df1.columns.str.strip()
-        
-        print(f"Loaded {len(df1)} rows from agro zones sheet")
-        print(f"Available zones: {df1['Names'].unique().tolist()}")
-        
-        # Load general organic farming data
-        df2 = pd.read_excel("zone wise data.xlsx", sheet_name="organic farming")
-        df2.columns = df2.columns.str.strip()
+        # Parsed once and shared; re-read only when the workbook changes
+        dataset = get_zone_dataset()
+        print(f"Available zones: {sorted({r.names for r in dataset.records})}")
         
         documents = []
 
         # Process zone-specific data
         if zone:
-            print(f"Searching for zone: {zone}")
-            zone_norm = zone.strip().lower()
-            # Search in 'Names' column instead of 'Zones' column
-            zone_data = df1[df1['Names'].str.strip().str.lower().str.contains(zone_norm, na=False)]
-
-            if zone_data.empty:
-                zone_data = df1[df1['Names'].str.strip().str.lower() == zone_norm]
-                
-            print(f"Found {len(zone_data)} matching rows for zone: {zone}")
-
-            if not zone_data.empty:
-                for _, row in zone_data.iterrows():
-                    zone_info = f"Zone: {row.get('Zones', 'N/A')}\n"
-                    zone_info += f"Zone Name: {row.get('Names', 'N/A')}\n"
-                    zone_info += f"Climate: {row.get('Climate', 'N/A')}\n"
-                    zone_info += f"Districts: {row.get('Districts', 'N/A')}\n"
-                    zone_info += f"Soil Types: {row.get('Soil Types', 'N/A')}\n"
-                    zone_info += f"Major crops: {row.get('Major crops', 'N/A')}\n"
-                    zone_info += f"Rainfall: {row.get('Rain fall', 'N/A')}\n"
-                    
-                    # Add alternative phrasings for better matching
-                    zone_info += f"\nSoil information: {row.get('Soil Types', 'N/A')}\n"
-                    zone_info += f"Crop information: {row.get('Major crops', 'N/A')}\n"
-                    zone_info += f"Weather information: {row.get('Climate', 'N/A')}\n"
-
-                    print(f"Created document with content: {zone_info[:100]}...")
-                    documents.append(Document(
-                        page_content=zone_info,
-                        metadata={"source": "agro_zones", "zone": zone}
-                    ))
+            documents.extend(build_zone_location_documents(dataset, zone))
 
         # Process general organic farming Q&A data
-        for _, row in df2.iterrows():
-            question = str(row.iloc[0]).strip() if len(row) > 0 and pd.notna(row.iloc[0]) else ""
-            answer = str(row.iloc[1]).strip() if len(row) > 1 and pd.notna(row.iloc[1]) else ""
-            
-            if question and answer and question.lower() != 'nan' and answer.lower() != 'nan':
-                qa_pair = f"Q: {question}\nA: {answer}"
-                documents.append(Document(
-                    page_content=qa_pair,
-                    metadata={"source": "organic_farming", "type": "general"}
-                ))
+        documents.extend(build_zone_general_documents(dataset))
 
         print(f"Total documents created: {len(documents)}")
         return documents
@@ -102,35 +96,23 @@ def load_zone_data(zone=None):
         print(f"Error loading zone data: {e}")
         return []
 
+# Chunking used for zone indexes built without the bundle
+CHUNKING = {"chunk_size": 800, "chunk_overlap": 100}
+
 def create_zone_vectorstore(documents):
     """Create FAISS vectorstore"""
     if not documents:
         return None
         
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,
-        chunk_overlap=100
-    )
+    text_splitter = RecursiveCharacterTextSplitter(**CHUNKING)
     
     texts = text_splitter.split_documents(documents)
-    embeddings = OpenAIEmbeddings()
-    return FAISS.from_documents(texts, embeddings)
-
-def preload_zone_data(zone):
-    """Preload agricultural data for the specified zone"""
-    global _zone_vectorstore, _current_zone
-    
-    if _current_zone != zone:
-        documents = load_zone_data(zone)
-        if documents:
-            _zone_vectorstore = create_zone_vectorstore(documents)
-            _current_zone = zone
-            return True
-    return _zone_vectorstore is not None
+    embeddings = get_embeddings()
+    return vectorstore_from_documents(texts, embeddings, backend=VECTOR_BACKEND)
 
 def create_zone_qa_chain(vectorstore):
     """Create QA chain for zone queries"""
-    llm = ChatOpenAI(temperature=0, model='gpt-4-turbo', max_tokens=300)
+    llm = get_llm(max_tokens=300)
     
     template = """You are an agricultural assistant specialized in organic farming. Answer questions ONLY about agro-ecological zones and organic farming based on the provided data.
 
@@ -179,34 +161,79 @@ Answer:"""
     return RetrievalQA.from_chain_type(
         llm=llm,
         chain_type="stuff",
-        retriever=vectorstore.as_retriever(search_kwargs={"k": 5}),
+        retriever=hybrid_retriever(vectorstore, k=3),
         chain_type_kwargs={"prompt": prompt},
         return_source_documents=False
     )
 
-def get_zone_prep_response(query, zone=None):
-    """Get response for zone-based queries"""
-    global _zone_vectorstore
-    
+def get_zone_entry(zone):
+    """Return the cached vectorstore and QA chain for a zone, building them on a miss"""
+    key = ("zone", zone)
+    entry = location_cache.get(key)
+    if entry is not None and not is_fallback_entry(entry):
+        return entry
+
+    # Concurrent sessions asking for the same zone share one build
+    return single_flight.do(key, lambda: build_zone_entry(zone))
+
+def build_zone_entry(zone):
+    """Build and cache the vectorstore and QA chain for a zone"""
+    key = ("zone", zone)
+    entry = location_cache.peek(key)
+    if entry is not None and not is_fallback_entry(entry):
+        return entry
+
+    # Filtered view of the global index: a zone switch does no index work
+    vectorstore = get_location_index("zone", zone)
+    if vectorstore is None:
+        documents = load_zone_data(zone)
+        if not documents:
+            return None
+        vectorstore = create_zone_vectorstore(documents)
+
+    return location_cache.put(key, vectorstore, create_zone_qa_chain(vectorstore))
+
+def preload_zone_data(zone):
+    """Preload agricultural data for the specified zone"""
+    return get_zone_entry(zone) is not None
+
+def stream_zone_prep_response(query, zone=None):
+    """Stream the answer for zone-based queries as the LLM generates it"""
     # Debug: Check if zone is provided
     if not zone:
-        return "Please select an agro-ecological zone first."
+        return ResponseStream.from_text("Please select an agro-ecological zone first.")
+    
+    # Climate / soil / crops / rainfall / districts questions are answered straight from the sheet
+    answer = structured_answer(query, get_zone_dataset().find_zone(zone), zone)
+    if answer:
+        return ResponseStream.from_text(answer)
+    
+    # Repeated questions for this zone are served from the shared answer cache
+    scope = ("zone", zone, data_version(ZONE_WORKBOOK))
+    cached = answer_cache.get(scope, query)
+    if cached is not None:
+        return ResponseStream.from_text(cached)
     
     # Debug: Try to preload data
     print(f"Loading data for zone: {zone}")
-    if not preload_zone_data(zone):
-        return f"Unable to load data for zone: {zone}. Please check if the 'zone wise data.xlsx' file is available and the zone name is correct."
-    
-    if _zone_vectorstore is None:
-        return "Vectorstore is None after preloading data."
+    entry = get_zone_entry(zone)
+    if entry is None:
+        return ResponseStream.from_text(f"Unable to load data for zone: {zone}. Please check if the 'zone wise data.xlsx' file is available and the zone name is correct.")
     
-    try:
-        qa_chain = create_zone_qa_chain(_zone_vectorstore)
-        print(f"Querying: {query}")
-        result = qa_chain({"query": query})
-        answer = result.get('result', 'Unable to find relevant information.')
+    def finalize(answer):
+        answer = answer or 'Unable to find relevant information.'
         print(f"Answer: {answer}")
         return answer
-        
-    except Exception as e:
-        return f"Error processing your query: {str(e)}"
\ No newline at end of file
+    
+    print(f"Querying: {query}")
+    usage = {}
+    return ResponseStream(
+        stream_qa_chain(entry["qa_chain"], query, "zone", scope, usage),
+        finalize,
+        on_complete=lambda answer: answer_cache.put(scope, query, answer),
+        usage=usage
+    )
+
+def get_zone_prep_response(query, zone=None):
+    """Get response for zone-based queries"""
+    return stream_zone_prep_response(query, zone).read()
\ No newline at end of file
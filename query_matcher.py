@@ -0,0 +1,122 @@
+import re
+from typing import NamedTuple
+from crop_index import MULTIWORD_CROPS, CROP_SYNONYMS, KNOWN_CROPS, normalise_crop
+
+# Intent keywords, matched as substrings of the lowercased query.
+# Crop names are not listed here: they come from the crop vocabulary.
+INTENT_KEYWORDS = {
+    "agricultural": [
+        # Crops and farming
+        'crop', 'crops', 'farming', 'agriculture', 'cultivation', 'grow', 'growing',
+        'plant', 'planting', 'harvest', 'harvesting', 'seed', 'seeds', 'organic',
+        'vegetables', 'fruits',
+
+        # Soil and land
+        'soil', 'land', 'earth', 'field', 'farm', 'irrigation', 'fertilizer',
+        'compost', 'manure', 'pesticide', 'herbicide',
+
+        # Weather and climate
+        'climate', 'weather', 'rainfall', 'rain', 'temperature', 'season', 'seasonal',
+        'monsoon', 'drought', 'water',
+
+        # Locations (Pakistan geography)
+        'pakistan', 'province', 'district', 'zone', 'punjab', 'sindh', 'balochistan',
+        'khyber pakhtunkhwa', 'kpk', 'karachi', 'lahore', 'islamabad', 'faisalabad',
+
+        # Agricultural practices
+        'sowing', 'reaping', 'tillage', 'plowing', 'rotation', 'intercropping',
+        'livestock', 'dairy', 'poultry', 'cattle', 'buffalo', 'goat', 'sheep'
+    ],
+    # Broad questions that need a district or zone to be answerable
+    "general": [
+        'soil types', 'soil type', 'climate', 'rainfall', 'rain fall',
+        'weather', 'temperature', 'what are the', 'list all',
+        'all soil', 'all climate', 'all rainfall'
+    ],
+    # Mentioning a district or zone makes a general question specific enough
+    "specific": ['district', 'zone'],
+    "crop_location": [
+        'where can i grow', 'where to grow', 'which district', 'which province',
+        'districts for', 'areas for', 'suitable for', 'grow in', 'cultivation of',
+        'districts where', 'provinces where'
+    ],
+    # Phrases followed by the crop being asked about ("where to grow <crop>")
+    "crop_phrase": [
+        'where can i grow', 'where to grow', 'districts for', 'areas for',
+        'cultivation of', 'suitable for'
+    ],
+}
+
+class QueryAnalysis(NamedTuple):
+    """Intents and crop entities found in one Pakistan-wide query"""
+    agricultural: bool
+    general: bool
+    crop_location: bool
+    crops: list
+    crop: str
+
+def crop_surface_forms(crops):
+    """Return every spelling (plurals, synonyms, split words) that normalises to one of crops"""
+    candidates = set(crops) | set(CROP_SYNONYMS) | set(MULTIWORD_CROPS)
+    for crop in crops:
+        candidates.update((crop + "s", crop + "es"))
+        if crop.endswith("y"):
+            candidates.add(crop[:-1] + "ies")
+    return {form for form in candidates if normalise_crop(form) in crops}
+
+class QueryMatcher:
+    """One compiled regex classifying a query into every intent in a single scan.
+
+    Keywords keep their substring semantics; crop names match whole words.
+    Each keyword also carries the intents of any shorter keyword inside it,
+    so a longer match never hides a shorter one.
+    """
+
+    def __init__(self, crop_vocabulary):
+        self.crop_vocabulary = frozenset(crop_vocabulary)
+
+        intents = {}
+        for intent, keywords in INTENT_KEYWORDS.items():
+            for keyword in keywords:
+                intents.setdefault(keyword, set()).add(intent)
+        self.keyword_intents = {
+            keyword: frozenset().union(*(intents[other] for other in intents if other in keyword))
+            for keyword in intents
+        }
+
+        forms = crop_surface_forms(self.crop_vocabulary | KNOWN_CROPS)
+        keyword_alternation = "|".join(map(re.escape, sorted(self.keyword_intents, key=len, reverse=True)))
+        crop_alternation = "|".join(map(re.escape, sorted(forms, key=len, reverse=True)))
+        self.pattern = re.compile(
+            rf"(?P<crop>\b(?:{crop_alternation})\b)"
+            rf"|(?P<keyword>{keyword_alternation})(?=\s+(?P<object>\w+))?"
+        )
+
+    def analyse(self, query):
+        """Classify the query and extract the crops it mentions"""
+        found = set()
+        crops = []
+        crop = None
+        phrase_object = None
+
+        for match in self.pattern.finditer(query.lower()):
+            word = match.group("crop")
+            if word:
+                found.add("agricultural")
+                canonical = normalise_crop(word)
+                if canonical in self.crop_vocabulary and canonical not in crops:
+                    crops.append(canonical)
+                crop = crop or word
+            else:
+                keyword_intents = self.keyword_intents[match.group("keyword")]
+                found.update(keyword_intents)
+                if "crop_phrase" in keyword_intents and phrase_object is None:
+                    phrase_object = match.group("object")
+
+        return QueryAnalysis(
+            agricultural="agricultural" in found,
+            general="general" in found and "specific" not in found,
+            crop_location="crop_location" in found,
+            crops=crops,
+            crop=crop or phrase_object
+        )
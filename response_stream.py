@@ -0,0 +1,84 @@
+from context_builder import build_context, count_tokens
+
+class ResponseStream:
+    """Answer text delivered as it is generated.
+
+    Iterating yields text deltas as the LLM produces them. Once the stream is
+    exhausted, .text holds the final answer after the mode's post-processing,
+    which may differ slightly from the concatenated deltas (trimmed trailing
+    fragments, location prefixes). on_complete receives that final text only
+    when generation succeeded, e.g. to cache it. usage reports the prompt
+    size of LLM-generated answers and stays empty for ready-made ones.
+    """
+
+    def __init__(self, tokens, finalize=None, error_prefix="Error processing your query", on_complete=None, usage=None):
+        self._tokens = tokens
+        self._finalize = finalize
+        self._error_prefix = error_prefix
+        self._on_complete = on_complete
+        self.text = None
+        # Filled by stream_qa_chain with prompt_tokens once the prompt is built
+        self.usage = usage if usage is not None else {}
+
+    @classmethod
+    def from_text(cls, text):
+        """Wrap a ready-made answer (static messages, data lookups) as a stream"""
+        return cls(iter([text]))
+
+    def __iter__(self):
+        if self.text is not None:
+            yield self.text
+            return
+
+        parts = []
+        try:
+            for token in self._tokens:
+                if token:
+                    parts.append(token)
+                    yield token
+            answer = "".join(parts)
+            self.text = self._finalize(answer) if self._finalize else answer
+            if self._on_complete:
+                self._on_complete(self.text)
+        except Exception as e:
+            self.text = f"{self._error_prefix}: {str(e)}"
+            print(self.text)
+            yield self.text
+
+    def read(self):
+        """Consume the stream and return the final answer"""
+        for _ in self:
+            pass
+        return self.text
+
+def stream_qa_chain(qa_chain, query, mode=None, scope=None, usage=None, prompt_values=None):
+    """Yield the answer of a "stuff" RetrievalQA chain token by token.
+
+    Runs the chain's retrieval and prompt but packs the context to the
+    mode's token budget (see context_builder) and streams the LLM output
+    instead of waiting for the whole completion. prompt_values fills any
+    prompt variables besides the context and question; only query is
+    used for retrieval. The prompt size is logged and, when usage is a
+    dict, recorded in it as prompt_tokens.
+    """
+    context, cached = build_context(qa_chain, query, mode, scope)
+
+    combine_chain = qa_chain.combine_documents_chain
+    llm_chain = combine_chain.llm_chain
+    # RetrievalQA hands the query to the stuff chain as "question"
+    prompt = llm_chain.prompt.format_prompt(**{
+        **(prompt_values or {}),
+        combine_chain.document_variable_name: context.text,
+        "question": query
+    })
+
+    prompt_tokens = count_tokens(prompt.to_string())
+    print(
+        f"Prompt tokens ({mode or 'chain'}): {prompt_tokens}, context {context.tokens} tokens "
+        f"from {context.chunks} of {context.candidates} chunks{' (cached context)' if cached else ''}"
+    )
+    if usage is not None:
+        usage.update(prompt_tokens=prompt_tokens, context_tokens=context.tokens, context_cached=cached)
+
+    for chunk in llm_chain.llm.stream(prompt):
+        yield chunk.content
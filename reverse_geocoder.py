@@ -0,0 +1,117 @@
+import os
+import csv
+import math
+import threading
+from functools import lru_cache
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Bundled gazetteer: one row per district in PROVINCE_DISTRICTS (name, province, lat, lon)
+GAZETTEER_FILE = "pakistan_gazetteer.csv"
+
+EARTH_RADIUS_KM = 6371.0
+
+# Beyond this distance the nearest gazetteer place is not a useful name
+MAX_DISTANCE_KM = float(os.getenv("REVERSE_GEOCODER_MAX_KM", "150"))
+
+# Set REVERSE_GEOCODER_NETWORK=1 to fall back to Nominatim for far-away points
+NETWORK_FALLBACK = os.getenv("REVERSE_GEOCODER_NETWORK", "0") == "1"
+
+# Lookups are cached on coordinates rounded to ~11 m
+QUANTISE_DECIMALS = 4
+
+def to_unit_vectors(lats, lons):
+    """Convert degrees to 3D points on the unit sphere (chord distance ~ great-circle)"""
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lon = np.radians(np.asarray(lons, dtype=float))
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+class OfflineGeocoder:
+    """Nearest-place reverse geocoder over a KD-tree of gazetteer coordinates"""
+
+    def __init__(self, names, provinces, lats, lons):
+        self.names = list(names)
+        self.provinces = list(provinces)
+        self.tree = cKDTree(to_unit_vectors(lats, lons))
+
+    def nearest_many(self, points):
+        """Return (name, province, distance_km) for many (lat, lon) points"""
+        coords = np.asarray(points, dtype=float).reshape(-1, 2)
+        chords, idx = self.tree.query(to_unit_vectors(coords[:, 0], coords[:, 1]))
+        km = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chords / 2, 1.0))
+        return [(self.names[i], self.provinces[i], float(d)) for i, d in zip(idx, km)]
+
+    def nearest(self, lat, lon):
+        """Return (name, province, distance_km) of the closest gazetteer place"""
+        lat_r, lon_r = math.radians(lat), math.radians(lon)
+        point = (math.cos(lat_r) * math.cos(lon_r), math.cos(lat_r) * math.sin(lon_r), math.sin(lat_r))
+        chord, i = self.tree.query(point)
+        return self.names[i], self.provinces[i], 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+
+def load_gazetteer(path=GAZETTEER_FILE):
+    """Read the gazetteer CSV into an OfflineGeocoder"""
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    return OfflineGeocoder(
+        [r["name"] for r in rows],
+        [r["province"] for r in rows],
+        [float(r["lat"]) for r in rows],
+        [float(r["lon"]) for r in rows]
+    )
+
+# Global variable holding the process-wide geocoder
+_geocoder = None
+_lock = threading.Lock()
+
+def get_offline_geocoder():
+    """Return the shared offline geocoder, loading it on first use"""
+    global _geocoder
+
+    if _geocoder is None:
+        with _lock:
+            if _geocoder is None:
+                try:
+                    _geocoder = load_gazetteer()
+                except Exception as e:
+                    print(f"Error loading gazetteer: {e}")
+                    return None
+    return _geocoder
+
+def network_location_name(lat, lon):
+    """Reverse geocode through Nominatim (slow, rate-limited, needs network)"""
+    from geopy.geocoders import Nominatim
+    from geopy.exc import GeocoderTimedOut
+
+    try:
+        geolocator = Nominatim(user_agent="agro_zone_app")
+        location = geolocator.reverse((lat, lon), timeout=10)
+        if location and location.raw and "address" in location.raw:
+            address = location.raw["address"]
+            return address.get("city") or address.get("town") or address.get("village") or address.get("county")
+        return None
+    except GeocoderTimedOut:
+        print("Geocoder timeout")
+        return None
+    except Exception as e:
+        print(f"Error getting location name: {e}")
+        return None
+
+@lru_cache(maxsize=4096)
+def _reverse_geocode(lat, lon):
+    geocoder = get_offline_geocoder()
+    if geocoder is not None:
+        name, _, distance_km = geocoder.nearest(lat, lon)
+        if distance_km <= MAX_DISTANCE_KM:
+            return name
+    if NETWORK_FALLBACK:
+        return network_location_name(lat, lon) or "Unknown"
+    return "Unknown"
+
+def reverse_geocode(lat, lon):
+    """Return the nearest town/district name for (lat, lon).
+
+    Answers from the bundled gazetteer; points further than MAX_DISTANCE_KM
+    from every place go to Nominatim when NETWORK_FALLBACK is enabled and
+    are "Unknown" otherwise.
+    """
+    return _reverse_geocode(round(lat, QUANTISE_DECIMALS), round(lon, QUANTISE_DECIMALS))
@@ -0,0 +1,65 @@
+import os
+import time
+import threading
+from concurrent.futures import Future
+
+# Backoff after a failed build: first retry delay, doubling up to the maximum
+FAILURE_BACKOFF = float(os.getenv("PRELOAD_FAILURE_BACKOFF", "5"))
+MAX_FAILURE_BACKOFF = float(os.getenv("PRELOAD_MAX_FAILURE_BACKOFF", "300"))
+
+class SingleFlight:
+    """Runs at most one build per key; concurrent callers wait for its result.
+
+    A build fails when it raises or returns None/False. The failure is
+    remembered for the key and returned to callers without rebuilding until
+    the backoff expires, which doubles on each consecutive failure.
+    """
+
+    def __init__(self, backoff=5.0, max_backoff=300.0):
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._calls = {}
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, build):
+        """Return build()'s result for key, sharing an in-progress build if any"""
+        with self._lock:
+            failure = self._failures.get(key)
+            if failure is not None and failure["retry_at"] > time.time():
+                return failure["result"]
+
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = build()
+        except Exception as e:
+            print(f"Error building {key}: {e}")
+            result = None
+
+        with self._lock:
+            if result is None or result is False:
+                count = self._failures.get(key, {}).get("count", 0) + 1
+                delay = min(self.backoff * 2 ** (count - 1), self.max_backoff)
+                self._failures[key] = {"count": count, "retry_at": time.time() + delay, "result": result}
+                print(f"Build of {key} failed; retrying after {delay:g}s")
+            else:
+                self._failures.pop(key, None)
+            self._calls.pop(key, None)
+        future.set_result(result)
+        return result
+
+    def forget(self, key):
+        """Clear a remembered failure so the next call rebuilds immediately"""
+        with self._lock:
+            self._failures.pop(key, None)
+
+# Process-wide loader shared by every mode module
+single_flight = SingleFlight(backoff=FAILURE_BACKOFF, max_backoff=MAX_FAILURE_BACKOFF)
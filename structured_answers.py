@@ -0,0 +1,63 @@
+import re
+from crop_index import KNOWN_CROPS, crop_words
+
+# AgroRecord field -> pattern of questions asking for exactly that cell
+INTENT_PATTERNS = {
+    "climate": re.compile(r"\b(climate|climatic|temperatures?)\b"),
+    "soil_types": re.compile(r"\bsoils?\b"),
+    "major_crops": re.compile(r"\bcrops?\b"),
+    "rainfall": re.compile(r"\b(rain|rains|rainfall|precipitation)\b"),
+    "districts": re.compile(r"\b(districts?|areas? covered)\b"),
+}
+
+FIELD_LABELS = {
+    "climate": "Climate",
+    "soil_types": "Soil types",
+    "major_crops": "Major crops",
+    "rainfall": "Rainfall",
+    "districts": "Districts",
+}
+
+# Wording that needs reasoning over the data rather than quoting it
+OPEN_ENDED_PATTERN = re.compile(
+    r"\b(how(?! much| many)|why|should|if|when|best|suitable|suitability|recommend\w*|improve\w*|"
+    r"increase\w*|prepar\w*|manag\w*|organic|fertili[sz]\w*|compost\w*|control\w*|"
+    r"pests?|diseases?|sow\w*|harvest\w*|irrigat\w*|compare|comparison|affect\w*|impact\w*)\b"
+)
+
+def classify_intents(question, allowed=tuple(INTENT_PATTERNS)):
+    """Return the record fields a purely factual question asks for.
+
+    Returns an empty list for open-ended questions (advice, comparisons,
+    questions about a particular crop) so they go to the LLM.
+    """
+    text = question.lower()
+    if OPEN_ENDED_PATTERN.search(text):
+        return []
+    if any(word in KNOWN_CROPS for word in crop_words(text)):
+        return []
+    return [field for field in allowed if INTENT_PATTERNS[field].search(text)]
+
+def render_field(field, records, label):
+    """Format one field across the location's rows, skipping blanks and repeats"""
+    values = list(dict.fromkeys(getattr(r, field) for r in records if getattr(r, field) != "N/A"))
+    if not values:
+        return f"**{FIELD_LABELS[field]}:** This information is not available in the data for {label}."
+    if len(values) == 1:
+        return f"**{FIELD_LABELS[field]}:** {values[0]}"
+    return f"**{FIELD_LABELS[field]}:**\n" + "\n".join(f"• {value}" for value in values)
+
+def structured_answer(question, records, label, allowed=tuple(INTENT_PATTERNS)):
+    """Answer a tabular question straight from the location's rows.
+
+    Returns None when the question is open-ended or no rows matched, in
+    which case the caller falls back to retrieval and the LLM.
+    """
+    if not records:
+        return None
+    intents = classify_intents(question, allowed)
+    if not intents:
+        return None
+
+    sections = [render_field(field, records, label) for field in intents]
+    return f"For {label}:\n\n" + "\n\n".join(sections)
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+import answer_cache
+from answer_cache import AnswerCache
+
+SCOPE = ("district", "Punjab", "Lahore", 1.0)
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time() for the answer cache"""
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    return now
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    """Fake question embeddings; records every question embedded"""
+    vectors = {}
+    calls = []
+
+    def fake_embed_query(question):
+        calls.append(question)
+        return tuple(vectors.get(question, np.ones(4)))
+
+    monkeypatch.setattr(answer_cache, "embed_query", fake_embed_query)
+    fake_embed_query.vectors = vectors
+    fake_embed_query.calls = calls
+    return fake_embed_query
+
+def test_exact_match_ignores_case_and_punctuation(embeddings):
+    cache = AnswerCache()
+    cache.put(SCOPE, "Which crops grow in Lahore?", "Wheat and rice.")
+    assert cache.get(SCOPE, "which crops grow in lahore") == "Wheat and rice."
+    assert cache.stats()["exact_hits"] == 1
+
+def test_entries_expire_after_ttl(clock, embeddings):
+    cache = AnswerCache(ttl=60)
+    cache.put(SCOPE, "soil type", "Loam.")
+    clock[0] += 59
+    assert cache.get(SCOPE, "soil type") == "Loam."
+    clock[0] += 2
+    assert cache.get(SCOPE, "soil type") is None
+    assert cache.stats()["size"] == 0
+
+def test_scopes_are_isolated(embeddings):
+    cache = AnswerCache(similarity_threshold=0.9)
+    cache.put(SCOPE, "soil type", "Loam.")
+    assert cache.get(("district", "Punjab", "Multan", 1.0), "soil type") is None
+    # A new data version is a different scope as well
+    assert cache.get(("district", "Punjab", "Lahore", 2.0), "soil type") is None
+    assert cache.get(SCOPE, "soil type") == "Loam."
+
+def test_exact_match_wins_over_similar_question(embeddings):
+    cache = AnswerCache(similarity_threshold=0.9)
+    cache.put(SCOPE, "major crops", "Wheat.")
+    cache.put(SCOPE, "minor crops", "Berseem.")
+    embeddings.calls.clear()
+
+    assert cache.get(SCOPE, "Minor crops?") == "Berseem."
+    assert cache.stats()["exact_hits"] == 1
+    assert cache.stats()["similar_hits"] == 0
+    # An exact hit never embeds the question
+    assert embeddings.calls == []
+
+def test_similar_question_used_only_after_exact_miss(embeddings):
+    embeddings.vectors["main crops"] = np.ones(4)
+    cache = AnswerCache(similarity_threshold=0.9)
+    cache.put(SCOPE, "major crops", "Wheat.")
+    assert cache.get(SCOPE, "main crops") == "Wheat."
+    assert cache.stats()["similar_hits"] == 1
+
+def test_paraphrase_matching_off_by_default(embeddings):
+    cache = AnswerCache()
+    cache.put(SCOPE, "major crops", "Wheat.")
+    assert cache.get(SCOPE, "minor crops") is None
+    assert embeddings.calls == []
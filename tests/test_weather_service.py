@@ -0,0 +1,98 @@
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import pytest
+import weather_service
+
+CURRENT = {"main": {"temp": 31.0}, "weather": [{"main": "Clear"}], "timezone": 18000}
+FORECAST = {
+    "city": {"timezone": 18000},
+    "list": [
+        {"dt": 1700000000 + i * 10800, "main": {"temp": 25.0 + i}, "pop": 0.1, "weather": [{"main": "Clear"}]}
+        for i in range(8)
+    ]
+}
+
+class StubWeatherHandler(BaseHTTPRequestHandler):
+    """OpenWeather stand-in that answers slowly so concurrent calls overlap"""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        self.server.requests[path] += 1
+        self.server.client_ports.add(self.client_address[1])
+        time.sleep(self.server.delay)
+        payload = CURRENT if path.endswith("/weather") else FORECAST
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubWeatherHandler)
+    server.requests = Counter()
+    server.client_ports = set()
+    server.delay = 0.3
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    base_url = f"http://127.0.0.1:{server.server_port}/data/2.5"
+    monkeypatch.setattr(weather_service, "WEATHER_URL", f"{base_url}/weather")
+    monkeypatch.setattr(weather_service, "FORECAST_URL", f"{base_url}/forecast")
+    weather_service.clear_weather_cache()
+    yield server
+    weather_service.clear_weather_cache()
+    server.shutdown()
+    server.server_close()
+
+def test_concurrent_calls_share_one_upstream_request(stub_server):
+    # Both coordinates round to (31.52, 74.36)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        first = pool.submit(weather_service.get_weather, 31.5204, 74.3587)
+        second = pool.submit(weather_service.get_weather, 31.5198, 74.3591)
+        results = [first.result(timeout=10), second.result(timeout=10)]
+
+    assert stub_server.requests == {"/data/2.5/weather": 1, "/data/2.5/forecast": 1}
+    assert results[0][0] == results[1][0] == CURRENT
+    assert results[0][2] is results[1][2]
+    assert len(results[0][2]) == len(FORECAST["list"])
+
+def test_cached_payload_is_reused_until_ttl(stub_server, monkeypatch):
+    stub_server.delay = 0
+    now = [1000.0]
+    monkeypatch.setattr(weather_service.time, "time", lambda: now[0])
+
+    weather_service.get_weather(31.52, 74.36)
+    now[0] += weather_service.WEATHER_CACHE_TTL - 1
+    weather_service.get_weather(31.52, 74.36)
+    assert stub_server.requests["/data/2.5/weather"] == 1
+
+    now[0] += 2
+    weather_service.get_weather(31.52, 74.36)
+    assert stub_server.requests["/data/2.5/weather"] == 2
+
+def test_error_payloads_are_not_cached(stub_server, monkeypatch):
+    stub_server.delay = 0
+    monkeypatch.setattr(weather_service, "FORECAST_URL", weather_service.WEATHER_URL)
+
+    current, forecast, model = weather_service.get_weather(31.52, 74.36)
+    assert model is None
+    weather_service.get_weather(31.52, 74.36)
+    assert stub_server.requests["/data/2.5/weather"] == 4
+
+def test_requests_reuse_the_pooled_session(stub_server):
+    stub_server.delay = 0
+    weather_service.get_weather(31.52, 74.36)
+    weather_service.get_weather(24.86, 67.00)
+    # Four requests, at most two at a time, over kept-alive connections
+    assert sum(stub_server.requests.values()) == 4
+    assert len(stub_server.client_ports) <= 2
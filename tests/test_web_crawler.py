@@ -0,0 +1,160 @@
+import hashlib
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from langchain_community.embeddings import FakeEmbeddings
+import web_crawler
+
+def page(title, text, links=()):
+    anchors = "".join(f'<a href="{link}">{link}</a>' for link in links)
+    return f"<html><head><title>{title}</title></head><body><p>{text}</p>{anchors}</body></html>"
+
+class CountingEmbeddings(FakeEmbeddings):
+    """Fake embeddings that count embedded texts and can be made to fail"""
+    embedded: list = []
+    fail: bool = False
+
+    def embed_documents(self, texts):
+        if self.fail:
+            raise RuntimeError("embedding service unavailable")
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+class StubSiteHandler(BaseHTTPRequestHandler):
+    """Small store site: robots.txt, a sitemap and pages with ETags"""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = self.path
+        self.server.requests[path] += 1
+        status = self.server.statuses.get(path)
+        if status is not None:
+            return self.reply(status)
+        if path == "/robots.txt":
+            return self.reply(200, self.server.robots)
+        if path == "/sitemap.xml":
+            base = f"http://127.0.0.1:{self.server.server_port}"
+            urls = "".join(f"<url><loc>{base}{p}</loc></url>" for p in self.server.sitemap)
+            return self.reply(200, f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>')
+        if path not in self.server.pages:
+            return self.reply(404)
+
+        body = self.server.pages[path]
+        etag = '"%s"' % hashlib.sha1(body.encode("utf-8")).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            return self.reply(304)
+        self.reply(200, body, {"ETag": etag, "Content-Type": "text/html"})
+
+    def reply(self, status, body="", headers=None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def site(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubSiteHandler)
+    server.requests = Counter()
+    server.statuses = {}
+    server.robots = "User-agent: *\nDisallow: /private/\n"
+    server.pages = {
+        "/": page("Home", "Seeds and fertilizer for Punjab farmers", ["/wheat/", "/private/orders/"]),
+        "/wheat/": page("Wheat", "Certified wheat seed, 50 kg bags"),
+        "/private/orders/": page("Orders", "Customer order history"),
+        "/maize/": page("Maize", "Hybrid maize seed for spring sowing"),
+    }
+    # Maize is only reachable through the sitemap
+    server.sitemap = ["/", "/maize/"]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    embeddings = CountingEmbeddings(size=16, embedded=[])
+    monkeypatch.setattr(web_crawler, "get_embeddings", lambda: embeddings)
+    monkeypatch.setattr(web_crawler, "_rate_limiter", web_crawler.HostRateLimiter(0))
+    server.embeddings = embeddings
+    server.seeds = [f"http://127.0.0.1:{server.server_port}/"]
+    server.url = lambda path: f"http://127.0.0.1:{server.server_port}{path}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def sources(vectorstore):
+    return {
+        vectorstore.docstore.search(vectorstore.index_to_docstore_id[i]).metadata["source"]
+        for i in range(vectorstore.index.ntotal)
+    }
+
+def test_first_crawl_follows_sitemap_and_links_within_robots(site):
+    state = {}
+    vectorstore, changed = web_crawler.refresh_vectorstore(None, site.seeds, state)
+
+    assert sources(vectorstore) == {site.url("/"), site.url("/wheat/"), site.url("/maize/")}
+    assert changed == 3
+    assert site.requests["/private/orders/"] == 0
+    assert set(state) == sources(vectorstore)
+
+def test_unchanged_pages_are_not_embedded_again(site):
+    state = {}
+    vectorstore, _ = web_crawler.refresh_vectorstore(None, site.seeds, state)
+    site.embeddings.embedded.clear()
+
+    vectorstore, changed = web_crawler.refresh_vectorstore(vectorstore, site.seeds, state)
+    assert changed == 0
+    assert site.embeddings.embedded == []
+
+    site.pages["/wheat/"] = page("Wheat", "Certified wheat seed, now in 25 kg bags")
+    vectorstore, changed = web_crawler.refresh_vectorstore(vectorstore, site.seeds, state)
+    assert changed == 1
+    assert all("25 kg" in text for text in site.embeddings.embedded)
+    assert len(sources(vectorstore)) == 3
+
+def test_missing_page_is_removed(site):
+    state = {}
+    vectorstore, _ = web_crawler.refresh_vectorstore(None, site.seeds, state)
+    before = vectorstore.index.ntotal
+
+    del site.pages["/maize/"]
+    vectorstore, changed = web_crawler.refresh_vectorstore(vectorstore, site.seeds, state)
+
+    assert changed == 1
+    assert site.url("/maize/") not in sources(vectorstore)
+    assert site.url("/maize/") not in state
+    assert vectorstore.index.ntotal < before
+
+def test_failed_embedding_keeps_old_vectors_and_retries(site):
+    state = {}
+    vectorstore, _ = web_crawler.refresh_vectorstore(None, site.seeds, state)
+    old_hash = state[site.url("/wheat/")]["hash"]
+
+    site.pages["/wheat/"] = page("Wheat", "Certified wheat seed, now in 25 kg bags")
+    site.embeddings.fail = True
+    vectorstore, changed = web_crawler.refresh_vectorstore(vectorstore, site.seeds, state)
+    assert changed == 0
+    assert state[site.url("/wheat/")]["hash"] == old_hash
+    assert site.url("/wheat/") in sources(vectorstore)
+
+    site.embeddings.fail = False
+    vectorstore, changed = web_crawler.refresh_vectorstore(vectorstore, site.seeds, state)
+    assert changed == 1
+    texts = [vectorstore.docstore.search(i).page_content for i in state[site.url("/wheat/")]["ids"]]
+    assert any("25 kg" in text for text in texts)
+
+def test_server_errors_do_not_shrink_the_index(site):
+    state = {}
+    vectorstore, _ = web_crawler.refresh_vectorstore(None, site.seeds, state)
+    before = vectorstore.index.ntotal
+
+    site.statuses.update({"/": 503, "/sitemap.xml": 503})
+    vectorstore, changed = web_crawler.refresh_vectorstore(vectorstore, site.seeds, state)
+
+    assert changed == 0
+    assert vectorstore.index.ntotal == before
+    assert set(state) == {site.url("/"), site.url("/wheat/"), site.url("/maize/")}
+    # The home page's links from the last crawl are still refreshed
+    assert site.requests["/wheat/"] == 2
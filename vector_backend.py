@@ -0,0 +1,181 @@
+import os
+import numpy as np
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+# Backend for the small per-location stores (district and zone fallbacks, a few
+# hundred chunks): "faiss" or "numpy" (exact search, below). Requests search
+# one query at a time, where IndexFlatL2 is faster, so FAISS is the default.
+# The global bundle, the Pakistan-wide fallback and the web store always use FAISS.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "faiss")
+
+# Storage type of NumpyIndex vectors: float32, float16 or int8 (per-row scaled)
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float32")
+
+# Rows converted back to float32 at a time when searching quantised vectors
+DEQUANTISE_BLOCK = 4096
+
+class NumpyIndex:
+    """Exact L2 search over one contiguous matrix: a single matmul plus argpartition.
+
+    Implements the parts of the FAISS index API that LangChain's FAISS
+    vectorstore, vector_index and HybridRetriever use (add, search,
+    remove_ids, ntotal, d), so it drops in behind the same wrapper. A batch
+    of queries is scored with one matmul, several times faster than
+    IndexFlatL2 (see bench_vectorstore.py); a single query is slower, so it
+    only pays off for batch work such as evaluation runs.
+
+    Distances are squared L2 like IndexFlatL2. Vectors can be stored as
+    float32, float16, or int8 with one scale per row; the quantised types
+    use half or a quarter of the memory but are dequantised on every search,
+    so they pay off for batched queries rather than one at a time.
+    """
+
+    def __init__(self, d, dtype="float32"):
+        if dtype not in ("float32", "float16", "int8"):
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        self.d = d
+        self.dtype = dtype
+        self.vectors = np.zeros((0, d), dtype=np.int8 if dtype == "int8" else dtype)
+        self.scales = np.zeros(0, dtype=np.float32)
+        self.norms = np.zeros(0, dtype=np.float32)
+
+    @classmethod
+    def from_arrays(cls, vectors, scales=None, norms=None, dtype="float32"):
+        """Wrap stored arrays (possibly memory-mapped) without copying them"""
+        index = cls(vectors.shape[1], dtype)
+        index.vectors = vectors
+        index.scales = scales if scales is not None else np.zeros(0, dtype=np.float32)
+        index.norms = norms if norms is not None else index._row_norms(0, len(vectors))
+        return index
+
+    @property
+    def ntotal(self):
+        return len(self.vectors)
+
+    def _quantise(self, x):
+        if self.dtype == "int8":
+            scales = np.abs(x).max(axis=1) / 127
+            scales[scales == 0] = 1
+            return np.round(x / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return x.astype(self.dtype), None
+
+    def _block(self, start, stop):
+        """float32 copy of stored rows [start, stop)"""
+        block = self.vectors[start:stop].astype(np.float32)
+        if self.dtype == "int8":
+            block *= self.scales[start:stop, None]
+        return block
+
+    def _row_norms(self, start, stop):
+        norms = np.zeros(stop - start, dtype=np.float32)
+        for offset in range(start, stop, DEQUANTISE_BLOCK):
+            block = self._block(offset, min(offset + DEQUANTISE_BLOCK, stop))
+            norms[offset - start:offset - start + len(block)] = np.einsum("ij,ij->i", block, block)
+        return norms
+
+    def add(self, x):
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        start = self.ntotal
+        quantised, scales = self._quantise(x)
+        self.vectors = np.concatenate([self.vectors, quantised])
+        if scales is not None:
+            self.scales = np.concatenate([self.scales, scales])
+        # Norms of the stored (possibly quantised) rows keep distances consistent
+        self.norms = np.concatenate([self.norms, self._row_norms(start, self.ntotal)])
+
+    def remove_ids(self, ids):
+        keep = np.ones(self.ntotal, dtype=bool)
+        keep[np.asarray(ids, dtype=np.int64)] = False
+        removed = int(self.ntotal - keep.sum())
+        self.vectors = self.vectors[keep]
+        self.norms = self.norms[keep]
+        if self.dtype == "int8":
+            self.scales = self.scales[keep]
+        return removed
+
+    def _dot(self, x):
+        """x @ vectors.T in float32, dequantising in blocks when needed"""
+        if self.dtype == "float32":
+            return x @ self.vectors.T
+        products = np.empty((len(x), self.ntotal), dtype=np.float32)
+        for start in range(0, self.ntotal, DEQUANTISE_BLOCK):
+            stop = min(start + DEQUANTISE_BLOCK, self.ntotal)
+            products[:, start:stop] = x @ self._block(start, stop).T
+        return products
+
+    def search(self, x, k, params=None, allowed=None):
+        """Return (distances, positions) of the k nearest rows for each query row.
+
+        allowed is an optional boolean mask of searchable rows. Missing
+        results are padded with position -1, as FAISS does.
+        """
+        x = np.ascontiguousarray(np.atleast_2d(x), dtype=np.float32)
+        n = len(x)
+        top = min(k, self.ntotal)
+        if top <= 0:
+            return np.full((n, k), np.inf, dtype=np.float32), np.full((n, k), -1, dtype=np.int64)
+
+        # ||v - x||^2 = ||v||^2 - 2 v.x + ||x||^2; the ||x||^2 term does not
+        # change the ranking, so it is only added to the k results
+        scores = self._dot(x)
+        scores *= -2
+        scores += self.norms
+        if allowed is not None:
+            scores[:, ~allowed] = np.inf
+
+        rows = np.arange(n)[:, None]
+        if top < self.ntotal:
+            candidates = np.argpartition(scores, top - 1, axis=1)[:, :top]
+            candidate_scores = scores[rows, candidates]
+        else:
+            candidates = np.broadcast_to(np.arange(self.ntotal), scores.shape)
+            candidate_scores = scores
+        order = np.argsort(candidate_scores, axis=1)
+        positions = candidates[rows, order]
+        distances = candidate_scores[rows, order]
+        distances += np.einsum("ij,ij->i", x, x)[:, None]
+
+        # Filtered-out rows only appear when fewer than k rows are allowed
+        if allowed is not None:
+            positions[np.isinf(distances)] = -1
+        if top < k:
+            distances = np.pad(distances, ((0, 0), (0, k - top)), constant_values=np.inf)
+            positions = np.pad(positions, ((0, 0), (0, k - top)), constant_values=-1)
+        return distances, positions
+
+def vectorstore_from_documents(documents, embedding, ids=None, backend="faiss", dtype=None):
+    """Build a FAISS-compatible vectorstore on the given backend.
+
+    Drop-in for FAISS.from_documents: the LangChain FAISS wrapper is kept
+    (docstore, id map, add/delete) and only the index behind it changes.
+    """
+    texts = [d.page_content for d in documents]
+    return vectorstore_from_embeddings(
+        list(zip(texts, embedding.embed_documents(texts))),
+        embedding,
+        metadatas=[d.metadata for d in documents],
+        ids=ids,
+        backend=backend,
+        dtype=dtype
+    )
+
+def vectorstore_from_embeddings(text_embeddings, embedding, metadatas=None, ids=None, backend="faiss", dtype=None):
+    """Like vectorstore_from_documents for (text, vector) pairs that are already embedded"""
+    if backend == "faiss":
+        return FAISS.from_embeddings(text_embeddings, embedding, metadatas=metadatas, ids=ids)
+
+    dimension = len(text_embeddings[0][1]) if text_embeddings else len(embedding.embed_query("dimension probe"))
+    vectorstore = FAISS(embedding, NumpyIndex(dimension, dtype or VECTOR_DTYPE), InMemoryDocstore(), {})
+    vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+    return vectorstore
+
+def search_index(index, embedding, k, bitmap=None, allowed=None):
+    """Search a FAISS or NumpyIndex restricted to the rows set in a packed bitmap"""
+    if bitmap is None:
+        return index.search(embedding, k)
+    if isinstance(index, NumpyIndex):
+        return index.search(embedding, k, allowed=allowed)
+    selector = faiss.IDSelectorBitmap(index.ntotal, faiss.swig_ptr(bitmap))
+    return index.search(embedding, k, params=faiss.SearchParameters(sel=selector))
@@ -0,0 +1,189 @@
+import os
+import json
+import mmap
+import shutil
+import hashlib
+from datetime import datetime
+import numpy as np
+import faiss
+from langchain.schema import Document
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from embedding_cache import EMBEDDING_MODEL, get_embeddings
+from vector_backend import NumpyIndex
+
+# On-disk layout of one persisted vectorstore folder:
+#   index.faiss    raw FAISS index, memory-mapped on load (FAISS backend)
+#   vectors.npy    stored vectors, memory-mapped on load (NumPy backend)
+#   scales.npy     per-row int8 scales (NumPy backend, int8 only)
+#   norms.npy      squared norms of the stored vectors (NumPy backend)
+#   docs.bin       JSON document records concatenated in index order
+#   offsets.npy    int64 byte offsets of each record in docs.bin (n + 1 entries)
+#   ids.json       docstore id of each record, in index order
+#   manifest.json  format version, embedding model, chunking, source hashes
+FORMAT_VERSION = 1
+INDEX_FILE = "index.faiss"
+DOCS_FILE = "docs.bin"
+OFFSETS_FILE = "offsets.npy"
+IDS_FILE = "ids.json"
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+SCALES_FILE = "scales.npy"
+NORMS_FILE = "norms.npy"
+
+class MmapDocstore(Docstore):
+    """Read-only docstore that decodes documents from a memory-mapped blob on demand.
+
+    Processes opening the same folder share the blob's page cache instead of
+    each holding every Document on its heap.
+    """
+
+    def __init__(self, folder, ids):
+        self._positions = {doc_id: i for i, doc_id in enumerate(ids)}
+        self._offsets = np.load(os.path.join(folder, OFFSETS_FILE), mmap_mode="r")
+        with open(os.path.join(folder, DOCS_FILE), "rb") as f:
+            # mmap cannot map an empty file; an empty index has no records to read
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+    def search(self, search):
+        position = self._positions.get(search)
+        if position is None:
+            return f"ID {search} not found."
+        start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+        record = json.loads(self._blob[start:end].decode("utf-8"))
+        return Document(page_content=record["page_content"], metadata=record["metadata"])
+
+    def close(self):
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+
+def file_hash(path):
+    """sha256 of a source file, for manifests"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def read_index_manifest(folder):
+    """Return a saved vectorstore's manifest, or None if it is missing or unreadable"""
+    try:
+        with open(os.path.join(folder, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error reading index manifest in {folder}: {e}")
+        return None
+
+def save_vectorstore(vectorstore, folder, chunking=None, sources=None, extra=None):
+    """Write a FAISS or NumPy-backed vectorstore to folder in the mmap-able format.
+
+    extra is merged into the manifest for caller-specific state. The files
+    are written to a temporary folder first and swapped in, so a crash
+    mid-save never leaves a half-written index behind.
+    """
+    ids = [vectorstore.index_to_docstore_id[i] for i in range(vectorstore.index.ntotal)]
+
+    tmp_folder = folder + ".tmp"
+    if os.path.exists(tmp_folder):
+        shutil.rmtree(tmp_folder)
+    os.makedirs(tmp_folder)
+
+    offsets = [0]
+    with open(os.path.join(tmp_folder, DOCS_FILE), "wb") as f:
+        for doc_id in ids:
+            document = vectorstore.docstore.search(doc_id)
+            record = json.dumps(
+                {"page_content": document.page_content, "metadata": document.metadata},
+                ensure_ascii=False
+            ).encode("utf-8")
+            f.write(record)
+            offsets.append(offsets[-1] + len(record))
+    np.save(os.path.join(tmp_folder, OFFSETS_FILE), np.array(offsets, dtype=np.int64))
+
+    with open(os.path.join(tmp_folder, IDS_FILE), "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+    index = vectorstore.index
+    if isinstance(index, NumpyIndex):
+        np.save(os.path.join(tmp_folder, VECTORS_FILE), np.ascontiguousarray(index.vectors))
+        np.save(os.path.join(tmp_folder, NORMS_FILE), np.ascontiguousarray(index.norms))
+        if index.dtype == "int8":
+            np.save(os.path.join(tmp_folder, SCALES_FILE), np.ascontiguousarray(index.scales))
+        backend = {"backend": "numpy", "dtype": index.dtype}
+    else:
+        faiss.write_index(index, os.path.join(tmp_folder, INDEX_FILE))
+        backend = {"backend": "faiss"}
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "embedding_model": EMBEDDING_MODEL,
+        **backend,
+        "dimension": vectorstore.index.d,
+        "count": len(ids),
+        "chunking": chunking or {},
+        "sources": sources or {},
+        "built_at": datetime.now().isoformat(),
+        **(extra or {})
+    }
+    with open(os.path.join(tmp_folder, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(folder):
+        shutil.rmtree(folder)
+    os.rename(tmp_folder, folder)
+    return manifest
+
+def load_numpy_index(folder, dtype, mmap_index=True):
+    """Open the vectors of a NumPy-backend folder, memory-mapped or read into memory"""
+    mmap_mode = "r" if mmap_index else None
+    scales_path = os.path.join(folder, SCALES_FILE)
+    return NumpyIndex.from_arrays(
+        np.load(os.path.join(folder, VECTORS_FILE), mmap_mode=mmap_mode),
+        scales=np.load(scales_path, mmap_mode=mmap_mode) if os.path.exists(scales_path) else None,
+        norms=np.load(os.path.join(folder, NORMS_FILE)),
+        dtype=dtype
+    )
+
+def load_vectorstore(folder, mmap_index=True):
+    """Open a vectorstore saved by save_vectorstore.
+
+    With mmap_index the vectors and the document blob stay on disk and
+    are paged in by the OS; the result is read-only. Without it everything is
+    read into memory so documents can be added and deleted. Raises ValueError
+    when the folder was written by another format version or embedding model.
+    """
+    manifest = read_index_manifest(folder)
+    if manifest is None:
+        raise ValueError(f"No index manifest in {folder}")
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Index format {manifest.get('format_version')} in {folder} is not {FORMAT_VERSION}")
+    if manifest.get("embedding_model") != EMBEDDING_MODEL:
+        raise ValueError(f"Index in {folder} was built with {manifest.get('embedding_model')}")
+
+    with open(os.path.join(folder, IDS_FILE), "r", encoding="utf-8") as f:
+        ids = json.load(f)
+    index_to_docstore_id = dict(enumerate(ids))
+
+    # Folders written before the NumPy backend existed hold a FAISS index
+    if manifest.get("backend") == "numpy":
+        index = load_numpy_index(folder, manifest.get("dtype", "float32"), mmap_index)
+    elif mmap_index:
+        # IO_FLAG_MMAP still copies a flat index's vectors onto the heap;
+        # IO_FLAG_MMAP_IFC maps them in place
+        index = faiss.read_index(
+            os.path.join(folder, INDEX_FILE),
+            faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+        )
+    else:
+        index = faiss.read_index(os.path.join(folder, INDEX_FILE))
+
+    if mmap_index:
+        docstore = MmapDocstore(folder, ids)
+    else:
+        mapped = MmapDocstore(folder, ids)
+        docstore = InMemoryDocstore({doc_id: mapped.search(doc_id) for doc_id in ids})
+        mapped.close()
+
+    return FAISS(get_embeddings(), index, docstore, index_to_docstore_id)
@@ -0,0 +1,145 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from build_index_bundle import ensure_index_bundle
+from zone_index import get_zone_index, get_zone_grid
+from reverse_geocoder import get_offline_geocoder
+from pakistan_context import preload_pakistan_context_data
+from web_scraper import preload_web_store_data
+from land_prep import preload_agro_data
+from prep_zone import preload_zone_data, get_agro_zones
+from location_based_zone import preload_location_zone_data, get_location_zones
+
+# Districts warmed at startup, as "Province:District" pairs separated by commas.
+# Districts plus zone and location entries should fit in LOCATION_CACHE_SIZE.
+DEFAULT_WARMUP_DISTRICTS = (
+    "Punjab:Lahore,Punjab:Faisalabad,Punjab:Multan,Punjab:Rawalpindi,Punjab:Gujranwala,"
+    "Punjab:Bahawalpur,Sindh:Hyderabad,Sindh:Sukkur,Khyber Pakhtunkhwa:Peshawar,"
+    "Balochistan:Quetta"
+)
+WARMUP_DISTRICTS = os.getenv("WARMUP_DISTRICTS", DEFAULT_WARMUP_DISTRICTS)
+
+# Zones warmed at startup (comma separated); empty means every workbook zone for
+# zone mode and every GeoJSON zone for location mode
+WARMUP_ZONES = os.getenv("WARMUP_ZONES", "")
+
+WARMUP_WORKERS = int(os.getenv("WARMUP_WORKERS", "4"))
+
+# Component states
+PENDING = "pending"
+RUNNING = "running"
+READY = "ready"
+FAILED = "failed"
+
+class WarmupScheduler:
+    """Runs preload tasks on a background thread pool and tracks their readiness.
+
+    Components are keyed like the location cache, e.g. ("pakistan",),
+    ("web_store",), ("zone_index",), ("index_bundle",),
+    ("district", province, district), ("zone", zone) or ("location", zone).
+    """
+
+    def __init__(self, max_workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="warmup")
+        self._futures = {}
+        self._status = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args):
+        """Schedule fn(*args) for key unless it is already scheduled"""
+        with self._lock:
+            if key in self._futures:
+                return self._futures[key]
+            self._status[key] = {"state": PENDING, "seconds": None, "error": None}
+            future = self._executor.submit(self._run, key, fn, *args)
+            self._futures[key] = future
+            return future
+
+    def _run(self, key, fn, *args):
+        with self._lock:
+            self._status[key]["state"] = RUNNING
+        start = time.perf_counter()
+        try:
+            ok = fn(*args) is not False
+            error = None if ok else "preload returned no data"
+        except Exception as e:
+            ok = False
+            error = str(e)
+        with self._lock:
+            self._status[key].update(
+                state=READY if ok else FAILED,
+                seconds=round(time.perf_counter() - start, 2),
+                error=error
+            )
+        if error:
+            print(f"Warm-up of {key} failed: {error}")
+        return ok
+
+    def is_ready(self, key):
+        """True once key has been warmed successfully"""
+        with self._lock:
+            return self._status.get(key, {}).get("state") == READY
+
+    def wait(self, key, timeout=None):
+        """Block until a scheduled warm-up of key finishes; True if it succeeded"""
+        with self._lock:
+            future = self._futures.get(key)
+        if future is None:
+            return False
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            return False
+
+    def status(self):
+        """Return a copy of every component's state, duration and error"""
+        with self._lock:
+            return {key: dict(value) for key, value in self._status.items()}
+
+def parse_districts(spec):
+    """Parse "Province:District,..." into (province, district) pairs"""
+    pairs = []
+    for item in spec.split(","):
+        province, _, district = item.partition(":")
+        if province.strip() and district.strip():
+            pairs.append((province.strip(), district.strip()))
+    return pairs
+
+# Process-wide scheduler shared by every Streamlit session
+scheduler = WarmupScheduler(max_workers=WARMUP_WORKERS)
+
+def warm_zone_lookup():
+    """Load the zone polygons, raster grid and offline geocoder"""
+    if get_zone_index() is None:
+        return False
+    get_zone_grid()
+    return get_offline_geocoder() is not None
+
+def after_bundle(fn, *args):
+    """Run fn(*args) once the bundle warm-up has finished, so it uses the global index"""
+    scheduler.wait(("index_bundle",))
+    return fn(*args)
+
+def start_warmup():
+    """Schedule warm-up of every mode; safe to call from each session"""
+    # The bundle goes first; until it loads, handlers fall back to local indexes
+    scheduler.submit(("index_bundle",), ensure_index_bundle)
+    scheduler.submit(("zone_index",), warm_zone_lookup)
+    scheduler.submit(("web_store",), preload_web_store_data)
+    scheduler.submit(("pakistan",), after_bundle, preload_pakistan_context_data)
+
+    for province, district in parse_districts(WARMUP_DISTRICTS):
+        scheduler.submit(("district", province, district), after_bundle, preload_agro_data, province, district)
+
+    zones = [z.strip() for z in WARMUP_ZONES.split(",") if z.strip()]
+    for zone in zones or get_agro_zones():
+        scheduler.submit(("zone", zone), after_bundle, preload_zone_data, zone)
+    # Location mode looks zones up by their GeoJSON names, which differ from the workbook's
+    for zone in zones or get_location_zones():
+        scheduler.submit(("location", zone), after_bundle, preload_location_zone_data, zone)
+    return scheduler
+
+def get_warmup_status():
+    """Return readiness of every warm-up component"""
+    return scheduler.status()
@@ -0,0 +1,103 @@
+import os
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from forecast_model import ForecastModel
+
+# Weather API Configuration (base URL can point at a local stub server)
+WEATHER_API_KEY = os.getenv("WEATHER_API_KEY", "fdec585c9ae956ef0e6e8c6e88016663")
+WEATHER_BASE_URL = os.getenv("WEATHER_BASE_URL", "https://api.openweathermap.org/data/2.5").rstrip("/")
+WEATHER_URL = f"{WEATHER_BASE_URL}/weather"
+FORECAST_URL = f"{WEATHER_BASE_URL}/forecast"
+WEATHER_TIMEOUT = 8
+
+# Upstream forecasts come in 3-hour steps, so cached payloads live as long
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", str(3 * 3600)))
+
+# Coordinates are rounded to ~1 km so nearby reruns share one cache entry
+COORD_DECIMALS = 2
+
+# One pooled session keeps connections to the weather API alive across reruns
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="weather")
+
+# Global cache of (expires_at, payload) and in-flight fetches keyed by rounded coordinates
+_cache = {}
+_in_flight = {}
+_lock = threading.Lock()
+
+def _get_json(url, params):
+    return _session.get(url, params=params, timeout=WEATHER_TIMEOUT).json()
+
+def _fetch_upstream(lat, lon):
+    """Fetch current weather and forecast concurrently"""
+    params = {"lat": lat, "lon": lon, "appid": WEATHER_API_KEY, "units": "metric"}
+    current = _executor.submit(_get_json, WEATHER_URL, params)
+    forecast = _executor.submit(_get_json, FORECAST_URL, params)
+    return current.result(), forecast.result()
+
+def _is_valid(current, forecast):
+    """Only complete payloads are cached; API error messages are retried next time"""
+    return (
+        isinstance(current, dict) and "main" in current and "weather" in current
+        and isinstance(forecast, dict) and "list" in forecast
+    )
+
+def get_weather(lat, lon):
+    """Return (current, forecast, forecast model) for the location.
+
+    The model is None when the API returned an error payload. Results are
+    cached per rounded coordinate for WEATHER_CACHE_TTL seconds, and
+    concurrent calls for the same place share a single upstream fetch.
+    Network errors propagate to the caller.
+    """
+    key = (round(lat, COORD_DECIMALS), round(lon, COORD_DECIMALS))
+
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] > time.time():
+            return cached[1]
+
+        future = _in_flight.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _in_flight[key] = future
+
+    if not owner:
+        return future.result()
+
+    try:
+        current, forecast = _fetch_upstream(*key)
+        model = None
+        if _is_valid(current, forecast):
+            # Parse the forecast once; the model is cached with the raw payload
+            model = ForecastModel(forecast, forecast.get("city", {}).get("timezone", current.get("timezone", 0)))
+            with _lock:
+                _cache[key] = (time.time() + WEATHER_CACHE_TTL, (current, forecast, model))
+                # Drop expired entries so the cache stays bounded by active locations
+                now = time.time()
+                for stale in [k for k, (expires_at, _) in _cache.items() if expires_at <= now]:
+                    del _cache[stale]
+        future.set_result((current, forecast, model))
+        return current, forecast, model
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _in_flight.pop(key, None)
+
+def fetch_current_and_forecast(lat, lon):
+    """Return (current, forecast) JSON for the location (cached, see get_weather)"""
+    current, forecast, _ = get_weather(lat, lon)
+    return current, forecast
+
+def clear_weather_cache():
+    """Drop all cached weather payloads"""
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,367 @@
+import os
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urljoin, urldefrag, urlparse
+from urllib import robotparser
+import xml.etree.ElementTree as ET
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from vector_backend import vectorstore_from_embeddings
+from embedding_cache import get_embeddings
+
+# Same chunking the web store has always used
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+REQUEST_TIMEOUT = 15
+USER_AGENT = "Mozilla/5.0 (compatible; agro-assistant-crawler)"
+ROBOTS_AGENT = "agro-assistant-crawler"
+
+# Crawl limits: total pages, concurrent fetches and requests per second per host
+MAX_PAGES = int(os.getenv("WEB_CRAWL_MAX_PAGES", "300"))
+CRAWL_WORKERS = int(os.getenv("WEB_CRAWL_WORKERS", "8"))
+HOST_RATE = float(os.getenv("WEB_CRAWL_RATE", "4"))
+
+# Chunks are embedded in batches while the remaining pages are still downloading
+EMBED_BATCH_SIZE = 64
+
+# Cart, account and admin pages carry no catalogue content
+SKIP_PATH_PARTS = ("/cart", "/checkout", "/my-account", "/wp-admin", "/wp-json", "/feed", "/wp-content")
+SKIP_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg", ".pdf", ".zip", ".css", ".js", ".xml")
+
+# Client errors mean the page is gone (404, 410, ...) except these, which are retried next refresh
+RETRY_STATUSES = (408, 429)
+
+# fetch_page result for a page the server says no longer exists
+PAGE_GONE = "gone"
+
+# One pooled session reuses connections across refreshes
+_session = requests.Session()
+_session.headers["User-Agent"] = USER_AGENT
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=CRAWL_WORKERS))
+_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=CRAWL_WORKERS))
+_executor = ThreadPoolExecutor(max_workers=CRAWL_WORKERS, thread_name_prefix="crawl")
+
+class HostRateLimiter:
+    """Spaces requests to each host at least 1/rate seconds apart"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host, delay=None):
+        """Block until the next request slot for host; delay overrides the interval"""
+        interval = max(self.interval, delay or 0)
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + interval
+        if slot > now:
+            time.sleep(slot - now)
+
+_rate_limiter = HostRateLimiter(HOST_RATE)
+
+def parse_page(url, html):
+    """Extract page text and metadata the way WebBaseLoader does, plus page links"""
+    soup = BeautifulSoup(html, "html.parser")
+    metadata = {"source": url}
+    if soup.title:
+        metadata["title"] = soup.title.get_text()
+    description = soup.find("meta", attrs={"name": "description"})
+    if description:
+        metadata["description"] = description.get("content", "No description found.")
+    html_tag = soup.find("html")
+    if html_tag:
+        metadata["language"] = html_tag.get("lang", "No language found.")
+    links = [urljoin(url, a["href"]) for a in soup.find_all("a", href=True)]
+    return Document(page_content=soup.get_text(), metadata=metadata), links
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def chunk_ids(url, count):
+    """Stable vector ids for a page's chunks"""
+    prefix = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+    return [f"{prefix}-{i}" for i in range(count)]
+
+def normalise_url(url):
+    """Drop fragments so the same page is only crawled once"""
+    return urldefrag(url)[0]
+
+def is_crawlable(url, hosts):
+    """Same-site HTML pages only; query-string variants (sorting, paging) are skipped"""
+    parsed = urlparse(url)
+    path = parsed.path.lower()
+    return (
+        parsed.scheme in ("http", "https")
+        and parsed.netloc in hosts
+        and not parsed.query
+        and not path.endswith(SKIP_EXTENSIONS)
+        and not any(part in path for part in SKIP_PATH_PARTS)
+    )
+
+def load_robots(base_url):
+    """Fetch and parse robots.txt; a missing or unreadable file allows everything"""
+    parser = robotparser.RobotFileParser()
+    try:
+        response = _session.get(urljoin(base_url, "/robots.txt"), timeout=REQUEST_TIMEOUT)
+        lines = response.text.splitlines() if response.status_code == 200 else []
+    except Exception as e:
+        print(f"Error fetching robots.txt for {base_url}: {e}")
+        lines = []
+    parser.parse(lines)
+    return parser
+
+def read_sitemap(url, depth=0):
+    """Return (page URLs listed in a sitemap, sitemaps that could not be read).
+
+    Sitemap indexes are followed. A missing sitemap (404/410) is not an
+    error; server and network errors are.
+    """
+    try:
+        response = _session.get(url, timeout=REQUEST_TIMEOUT)
+        if response.status_code in (404, 410):
+            return [], []
+        response.raise_for_status()
+        root = ET.fromstring(response.content)
+    except Exception as e:
+        print(f"Error reading sitemap {url}: {e}")
+        return [], [url]
+
+    locations = [loc.text.strip() for loc in root.findall(".//{*}loc") if loc.text]
+    if root.tag.endswith("sitemapindex") and depth < 2:
+        pages = []
+        failed = []
+        for location in locations:
+            location_pages, location_failed = read_sitemap(location, depth + 1)
+            pages.extend(location_pages)
+            failed.extend(location_failed)
+        return pages, failed
+    return locations, []
+
+def discover_urls(seed_urls, robots):
+    """Seed URLs followed by every sitemap page for the seeds' hosts.
+
+    Returns (urls, sitemaps that could not be read).
+    """
+    urls = list(seed_urls)
+    failed = []
+    for host, parser in robots.items():
+        sitemaps = parser.site_maps() or [f"{host}/sitemap.xml"]
+        for sitemap in sitemaps:
+            sitemap_urls, sitemap_failed = read_sitemap(sitemap)
+            urls.extend(sitemap_urls)
+            failed.extend(sitemap_failed)
+    return urls, failed
+
+def fetch_page(url, page_state, robots):
+    """Conditionally fetch a page.
+
+    Returns (document, validators, links). document is None when the server
+    answered 304 or the text hash is unchanged; links then come from the
+    previous crawl if the body was not downloaded. Returns PAGE_GONE when the
+    page no longer exists. Raises on network errors and server errors.
+    """
+    parsed = urlparse(url)
+    host = f"{parsed.scheme}://{parsed.netloc}"
+    _rate_limiter.wait(host, robots[host].crawl_delay(ROBOTS_AGENT))
+
+    headers = {}
+    if page_state.get("etag"):
+        headers["If-None-Match"] = page_state["etag"]
+    if page_state.get("last_modified"):
+        headers["If-Modified-Since"] = page_state["last_modified"]
+
+    response = _session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    if response.status_code == 304:
+        return None, {}, page_state.get("links", [])
+    if 400 <= response.status_code < 500 and response.status_code not in RETRY_STATUSES:
+        return PAGE_GONE
+    response.raise_for_status()
+
+    validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    document, links = parse_page(url, response.text)
+    if content_hash(document.page_content) == page_state.get("hash"):
+        return None, validators, links
+    return document, validators, links
+
+def crawl(seed_urls, crawl_state):
+    """Fetch the site concurrently, yielding (url, result) as pages arrive.
+
+    Pages come from the seeds, the hosts' sitemaps and links found while
+    crawling, limited to MAX_PAGES and to what robots.txt allows. result is
+    fetch_page's (document, validators, links), PAGE_GONE when the page was
+    removed, or None when the page or sitemap could not be fetched or the
+    page was left out by MAX_PAGES. A failed page's links from the previous
+    crawl are still followed, so one server error does not cut off the
+    pages below it.
+    """
+    hosts = {urlparse(url).netloc for url in seed_urls}
+    robots = {}
+    for url in seed_urls:
+        parsed = urlparse(url)
+        host = f"{parsed.scheme}://{parsed.netloc}"
+        if host not in robots:
+            robots[host] = load_robots(host)
+
+    seen = set()
+    skipped = []
+    pending = {}
+
+    def enqueue(urls):
+        for url in urls:
+            url = normalise_url(url)
+            if url in seen or not is_crawlable(url, hosts):
+                continue
+            parsed = urlparse(url)
+            parser = robots.get(f"{parsed.scheme}://{parsed.netloc}")
+            if parser is None or not parser.can_fetch(ROBOTS_AGENT, url):
+                continue
+            seen.add(url)
+            if len(seen) > MAX_PAGES:
+                skipped.append(url)
+                continue
+            future = _executor.submit(fetch_page, url, crawl_state.get(url, {}), robots)
+            pending[future] = url
+
+    urls, failed_sitemaps = discover_urls(seed_urls, robots)
+    for sitemap in failed_sitemaps:
+        yield sitemap, None
+    enqueue(urls)
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            url = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error fetching {url}: {e}")
+                enqueue(crawl_state.get(url, {}).get("links", []))
+                yield url, None
+                continue
+            if result is not PAGE_GONE:
+                enqueue(result[2])
+            yield url, result
+    for url in skipped:
+        yield url, None
+
+def delete_ids(vectorstore, ids):
+    """Delete vectors by docstore id, skipping ids the store no longer holds"""
+    known = set(vectorstore.index_to_docstore_id.values())
+    present = [i for i in ids if i in known]
+    if present:
+        vectorstore.delete(present)
+
+def refresh_vectorstore(vectorstore, seed_urls, crawl_state):
+    """Bring the vectorstore up to date with the site behind seed_urls.
+
+    crawl_state maps each URL to its ETag, Last-Modified, content hash,
+    links and chunk ids; it is updated in place. Only changed pages are
+    re-chunked and re-embedded, in batches as pages arrive; a page's old
+    vectors and state are replaced only once its new chunks are embedded,
+    so a failed batch is retried on the next refresh. Pages that fail to
+    download (connection or server errors) keep their existing vectors;
+    pages that answer 404/410 are removed. Pages that are no longer linked
+    are removed only when every page and sitemap was fetched, since after
+    a failure a page may just be unreachable this time.
+
+    Returns (vectorstore, number of pages changed).
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+    # Without per-page ids the old vectors cannot be patched; start over
+    if vectorstore is None or not crawl_state:
+        vectorstore = None
+        crawl_state.clear()
+
+    batch_chunks = []
+    batch_ids = []
+    # (url, state update) of the changed pages whose chunks are in the batch
+    batch_pages = []
+    crawled = set()
+    removed = set()
+    complete = True
+    changed = 0
+
+    def flush():
+        nonlocal vectorstore, changed
+        if not batch_chunks:
+            return
+        try:
+            texts = [c.page_content for c in batch_chunks]
+            text_embeddings = list(zip(texts, get_embeddings().embed_documents(texts)))
+        except Exception as e:
+            print(f"Error embedding {len(batch_pages)} changed pages, retrying next refresh: {e}")
+        else:
+            metadatas = [c.metadata for c in batch_chunks]
+            if vectorstore is None:
+                vectorstore = vectorstore_from_embeddings(text_embeddings, get_embeddings(), metadatas=metadatas, ids=batch_ids)
+            else:
+                # New chunk ids reuse the old ones, so the old vectors go first
+                delete_ids(vectorstore, [i for url, _ in batch_pages for i in crawl_state.get(url, {}).get("ids", [])])
+                vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=batch_ids)
+            for url, update in batch_pages:
+                crawl_state.setdefault(url, {}).update(update)
+            changed += len(batch_pages)
+        batch_chunks.clear()
+        batch_ids.clear()
+        batch_pages.clear()
+
+    for url, result in crawl(seed_urls, crawl_state):
+        if result is PAGE_GONE:
+            print(f"Page removed: {url}")
+            removed.add(url)
+            continue
+        crawled.add(url)
+        if result is None:
+            complete = False
+            continue
+
+        document, validators, links = result
+        validators = {k: v for k, v in validators.items() if v}
+        if document is None:
+            page_state = crawl_state.setdefault(url, {})
+            page_state.update(validators)
+            page_state["links"] = links
+            continue
+
+        # Validators are stored with the new hash, or a 304 would hide a failed embedding
+        chunks = splitter.split_documents([document])
+        ids = chunk_ids(url, len(chunks))
+        batch_chunks.extend(chunks)
+        batch_ids.extend(ids)
+        batch_pages.append((url, dict(validators, links=links, hash=content_hash(document.page_content), ids=ids)))
+        print(f"Page changed: {url} ({len(chunks)} chunks)")
+
+        if len(batch_chunks) >= EMBED_BATCH_SIZE:
+            flush()
+    flush()
+
+    # Pages that are gone, or no longer reachable from a complete crawl, are dropped
+    stale = [u for u in crawl_state if u in removed or (complete and u not in crawled)]
+    if not complete and any(u not in crawled and u not in removed for u in crawl_state):
+        print("Crawl incomplete; keeping pages that were not reached")
+    stale_ids = []
+    for url in stale:
+        stale_ids.extend(crawl_state.pop(url).get("ids", []))
+        changed += 1
+    if stale_ids and vectorstore is not None:
+        delete_ids(vectorstore, stale_ids)
+
+    return vectorstore, changed
+
+def content_version(crawl_state):
+    """Fingerprint of the crawled content, for caches keyed on it"""
+    digest = hashlib.sha1()
+    for url in sorted(crawl_state):
+        digest.update(f"{url}={crawl_state[url].get('hash')}".encode("utf-8"))
+    return digest.hexdigest()[:16]
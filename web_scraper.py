@@ -1,89 +1,111 @@
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain.chains import RetrievalQA
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.prompts import PromptTemplate
+from chain_registry import get_llm, get_chain, invalidate_chain
+from response_stream import ResponseStream, stream_qa_chain
+from answer_cache import answer_cache
+from single_flight import single_flight
+from web_crawler import CHUNK_SIZE, CHUNK_OVERLAP, refresh_vectorstore, content_version
+from hybrid_retriever import hybrid_retriever, forget_keyword_index
+from vector_index import load_vectorstore, read_index_manifest, save_vectorstore
 import os
-import pickle
+import shutil
 from datetime import datetime, timedelta
+from urllib.parse import urljoin
 
 # Global variables for caching
 _vectorstore = None
 _last_update = None
+_crawl_state = {}  # Per-URL ETag, Last-Modified, content hash and chunk ids
+_content_version = None
 _cache_duration = timedelta(hours=24)  # Cache for 24 hours
 
+# Persisted index folder (see vector_index); the pickle it replaces is removed on save
+CACHE_DIR = "pakorganic_index"
+LEGACY_CACHE_FILE = "pakorganic_vectorstore.pkl"
+
+# Crawl seeds; the rest of the catalogue is found through the sitemap and links.
+# WEB_STORE_URL can point the crawler at a local fixture site.
+STORE_URL = os.getenv("WEB_STORE_URL", "https://pakorganic.com/")
+STORE_URLS = [
+    STORE_URL,
+    urljoin(STORE_URL, "farming-consultancy/")
+]
+
+def is_vectorstore_fresh():
+    """Check if we have cached vectorstore and it's still valid"""
+    return (_vectorstore is not None and 
+            _last_update is not None and 
+            datetime.now() - _last_update < _cache_duration)
+
 def load_or_create_vectorstore():
     """Load cached vectorstore or create new one"""
-    global _vectorstore, _last_update
+    if is_vectorstore_fresh():
+        return _vectorstore
     
-    cache_file = "pakorganic_vectorstore.pkl"
+    # Concurrent sessions share one scrape; failures back off instead of stampeding
+    return single_flight.do(("web_store",), build_vectorstore)
+
+def build_vectorstore():
+    """Load the vectorstore from the file cache and refresh changed pages"""
+    global _vectorstore, _last_update, _crawl_state, _content_version
     
-    # Check if we have cached vectorstore and it's still valid
-    if (_vectorstore is not None and 
-        _last_update is not None and 
-        datetime.now() - _last_update < _cache_duration):
+    if is_vectorstore_fresh():
         return _vectorstore
     
-    # Try to load from file cache
-    if os.path.exists(cache_file):
+    # Start from the saved index; a stale index is refreshed rather than rebuilt
+    manifest = read_index_manifest(CACHE_DIR) if _vectorstore is None else None
+    if manifest is not None:
         try:
-            with open(cache_file, 'rb') as f:
-                cache_data = pickle.load(f)
-                if datetime.now() - cache_data['timestamp'] < _cache_duration:
-                    _vectorstore = cache_data['vectorstore']
-                    _last_update = cache_data['timestamp']
-                    return _vectorstore
-        except:
-            pass  # If loading fails, create new one
-    
-    # Create new vectorstore
-    urls = [
-        "https://pakorganic.com/",
-        "https://pakorganic.com/farming-consultancy/"
-    ]
+            # Loaded into memory (not mmapped) because refreshes patch it in place
+            vectorstore = load_vectorstore(CACHE_DIR, mmap_index=False)
+            _vectorstore = vectorstore
+            _last_update = datetime.fromisoformat(manifest['built_at'])
+            _crawl_state = manifest.get('crawl_state', {})
+            _content_version = content_version(_crawl_state)
+            invalidate_chain(("web_store",))
+            if is_vectorstore_fresh():
+                return _vectorstore
+        except Exception as e:
+            print(f"Error loading web store index, rebuilding: {e}")
+    
+    # Concurrent conditional GETs; only pages whose content changed are re-embedded
+    previous = _vectorstore
+    vectorstore, changed = refresh_vectorstore(_vectorstore, STORE_URLS, _crawl_state)
+    if vectorstore is None:
+        return None
     
-    # Load web content
-    loader = WebBaseLoader(urls)
-    documents = loader.load()
-    
-    # Split documents into chunks
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200
-    )
-    texts = text_splitter.split_documents(documents)
-    
-    # Create vectorstore
-    embeddings = OpenAIEmbeddings()
-    vectorstore = FAISS.from_documents(texts, embeddings)
-    
-    # Cache the vectorstore
     _vectorstore = vectorstore
     _last_update = datetime.now()
-    
-    # Save to file
+    _content_version = content_version(_crawl_state)
+    if vectorstore is not previous:
+        invalidate_chain(("web_store",))
+    elif changed:
+        # Patched in place: the chain stays valid but its keyword index is stale
+        forget_keyword_index(vectorstore)
+    print(f"Web store refreshed: {changed} page(s) changed")
+    
+    # Save the index (the refresh time is saved even when nothing changed)
     try:
-        with open(cache_file, 'wb') as f:
-            pickle.dump({
-                'vectorstore': vectorstore,
-                'timestamp': _last_update
-            }, f)
-    except:
-        pass  # If saving fails, still continue
+        save_vectorstore(
+            vectorstore,
+            CACHE_DIR,
+            chunking={"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP},
+            sources={url: state.get('hash') for url, state in _crawl_state.items()},
+            extra={'crawl_state': _crawl_state}
+        )
+        if os.path.exists(LEGACY_CACHE_FILE):
+            os.remove(LEGACY_CACHE_FILE)
+    except Exception as e:
+        print(f"Error saving web store index: {e}")  # Still serve from memory
     
     return vectorstore
 
 def preload_web_store_data():
     """Preload web store data to avoid delay on first query"""
-    load_or_create_vectorstore()
+    return load_or_create_vectorstore() is not None
 
-def scrape_web_store(query):
-    """Scrape pakorganic.com and provide intelligent responses"""
-    
-    # Get cached vectorstore
-    vectorstore = load_or_create_vectorstore()
-    
+def create_web_store_qa_chain(vectorstore):
+    """Create QA chain for web store queries"""
     # Define template with clickable source
     template = """You are a helpful assistant. Use the following web content as your primary reference to answer the user's question. If the answer is not clearly available, make a reasonable guess or summarize based on what is available. If you still cannot find anything useful, say: 'Sorry, this is out of my knowledge domain.'
 
@@ -103,30 +125,58 @@ Answer:"""
     # Create prompt and QA chain
     prompt = PromptTemplate(template=template, input_variables=["context", "question"])
     
-    llm = ChatOpenAI(temperature=0, model='gpt-4-turbo', max_tokens=200)
+    llm = get_llm(max_tokens=200)
     
-    qa_chain = RetrievalQA.from_chain_type(
+    return RetrievalQA.from_chain_type(
         llm=llm,
         chain_type="stuff",
-        retriever=vectorstore.as_retriever(search_kwargs={"k": 10}),
+        retriever=hybrid_retriever(vectorstore, k=6),
         chain_type_kwargs={"prompt": prompt},
         return_source_documents=False
     )
+
+def scrape_web_store(query):
+    """Scrape pakorganic.com and stream intelligent responses"""
     
-    # Get response
-    result = qa_chain({"query": query})
-    return result.get('result', 'Unable to find relevant information.')
+    # Get cached vectorstore
+    vectorstore = load_or_create_vectorstore()
+    if vectorstore is None:
+        return ResponseStream.from_text("Unable to load store data right now. Please try again shortly.")
+    
+    # Answers are reused until a crawled page's content changes
+    scope = ("web_store", _content_version)
+    cached = answer_cache.get(scope, query)
+    if cached is not None:
+        return ResponseStream.from_text(cached)
+    
+    # Reuse the chain until the vectorstore is rebuilt
+    qa_chain = get_chain(("web_store",), lambda: create_web_store_qa_chain(vectorstore))
+    
+    # Stream response
+    usage = {}
+    return ResponseStream(
+        stream_qa_chain(qa_chain, query, "web_store", scope, usage),
+        lambda answer: answer or 'Unable to find relevant information.',
+        on_complete=lambda answer: answer_cache.put(scope, query, answer),
+        usage=usage
+    )
+
+def stream_web_scraper_response(query):
+    """Stream the answer from pakorganic.com content as the LLM generates it"""
+    return scrape_web_store(query)
 
 def get_web_scraper_response(query):
     """Get response from pakorganic.com content"""
-    return scrape_web_store(query)
+    return stream_web_scraper_response(query).read()
 
 def clear_cache():
     """Clear the vectorstore cache"""
-    global _vectorstore, _last_update
+    global _vectorstore, _last_update, _crawl_state, _content_version
     _vectorstore = None
     _last_update = None
+    _crawl_state = {}
+    _content_version = None
+    invalidate_chain(("web_store",))
     
-    cache_file = "pakorganic_vectorstore.pkl"
-    if os.path.exists(cache_file):
-        os.remove(cache_file)
+    if os.path.exists(CACHE_DIR):
+        shutil.rmtree(CACHE_DIR)
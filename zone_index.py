@@ -0,0 +1,236 @@
+import os
+import csv
+import json
+import math
+import sys
+import threading
+from functools import lru_cache
+import numpy as np
+import shapely
+from shapely.geometry import shape
+from shapely.strtree import STRtree
+
+# Agro-ecological zone polygons (lon/lat, CRS84)
+GEOJSON_FILE = "ali_try3_colors.geojson"
+
+# Precomputed raster lookup grid; cell size in degrees, 0 disables the grid
+ZONE_GRID_FILE = "zone_grid.npz"
+ZONE_GRID_CELL_SIZE = float(os.getenv("ZONE_GRID_CELL_SIZE", "0.05"))
+
+# Grid cell codes (non-negative codes are zone indexes)
+GRID_OUTSIDE = -1
+GRID_BOUNDARY = -2
+
+# Exact lookups are cached on coordinates rounded to ~11 m
+QUANTISE_DECIMALS = 4
+
+class ZoneIndex:
+    """Prepared zone polygons behind an STRtree for fast point-in-zone lookups"""
+
+    def __init__(self, names, geometries):
+        self.names = np.asarray(names, dtype=object)
+        self.geometries = np.asarray(geometries, dtype=object)
+        shapely.prepare(self.geometries)
+        self.tree = STRtree(self.geometries)
+
+    def find_zones(self, points):
+        """Classify many (lat, lon) points in one vectorised call.
+
+        Returns a list with the zone name for each point, or None when the
+        point falls outside every zone. Where polygons overlap, the first
+        feature in the GeoJSON wins.
+        """
+        coords = np.asarray(points, dtype=float).reshape(-1, 2)
+        user_points = shapely.points(coords[:, 1], coords[:, 0])
+
+        point_idx, geom_idx = self.tree.query(user_points, predicate="within")
+
+        result = np.full(len(coords), None, dtype=object)
+        if len(point_idx):
+            order = np.lexsort((geom_idx, point_idx))
+            first_points, first_pos = np.unique(point_idx[order], return_index=True)
+            result[first_points] = self.names[geom_idx[order][first_pos]]
+        return result.tolist()
+
+    def find_zone(self, lat, lon):
+        """Return the zone name containing (lat, lon), or None"""
+        return self.find_zones([(lat, lon)])[0]
+
+    def get_geometry(self, zone_name):
+        """Return the first polygon with the given zone name, or None"""
+        matches = np.flatnonzero(self.names == zone_name)
+        return self.geometries[matches[0]] if len(matches) else None
+
+class ZoneGrid:
+    """Raster of zone codes over the zones' bounding box.
+
+    Cells lying entirely inside one polygon resolve in constant time; only
+    cells straddling a zone boundary fall back to the exact polygon test.
+    """
+
+    def __init__(self, zone_index, cells, bounds, cell_size):
+        self.zone_index = zone_index
+        self.cells = cells
+        self.bounds = tuple(bounds)
+        self.cell_size = cell_size
+
+    @classmethod
+    def build(cls, zone_index, cell_size):
+        """Rasterise the zone polygons at the given cell size"""
+        minx, miny, maxx, maxy = shapely.total_bounds(zone_index.geometries)
+        nx = math.ceil((maxx - minx) / cell_size)
+        ny = math.ceil((maxy - miny) / cell_size)
+
+        xs, ys = np.meshgrid(minx + np.arange(nx) * cell_size, miny + np.arange(ny) * cell_size)
+        boxes = shapely.box(xs.ravel(), ys.ravel(), xs.ravel() + cell_size, ys.ravel() + cell_size)
+
+        # Count polygons touching each cell, then find cells fully inside one polygon
+        hit_cells, _ = zone_index.tree.query(boxes, predicate="intersects")
+        touching = np.bincount(hit_cells, minlength=len(boxes))
+        inside_cells, inside_geoms = zone_index.tree.query(boxes, predicate="within")
+
+        cells = np.where(touching == 0, GRID_OUTSIDE, GRID_BOUNDARY).astype(np.int16)
+        single = touching[inside_cells] == 1
+        cells[inside_cells[single]] = inside_geoms[single]
+
+        return cls(zone_index, cells.reshape(ny, nx), (minx, miny, maxx, maxy), cell_size)
+
+    def save(self, path, source_mtime):
+        np.savez_compressed(
+            path,
+            cells=self.cells,
+            bounds=np.asarray(self.bounds),
+            cell_size=self.cell_size,
+            source_mtime=source_mtime
+        )
+
+    @classmethod
+    def load(cls, zone_index, path, cell_size, source_mtime):
+        """Load a saved grid, or None if it was built from other settings"""
+        with np.load(path) as data:
+            if float(data["cell_size"]) != cell_size or float(data["source_mtime"]) != source_mtime:
+                return None
+            return cls(zone_index, data["cells"], data["bounds"], cell_size)
+
+    def find_zones(self, points):
+        """Classify many (lat, lon) points, testing polygons only on boundary cells"""
+        coords = np.asarray(points, dtype=float).reshape(-1, 2)
+        minx, miny = self.bounds[0], self.bounds[1]
+        ny, nx = self.cells.shape
+
+        col = np.floor((coords[:, 1] - minx) / self.cell_size).astype(int)
+        row = np.floor((coords[:, 0] - miny) / self.cell_size).astype(int)
+        in_grid = (col >= 0) & (col < nx) & (row >= 0) & (row < ny)
+
+        codes = np.full(len(coords), GRID_OUTSIDE, dtype=np.int16)
+        codes[in_grid] = self.cells[row[in_grid], col[in_grid]]
+
+        result = np.full(len(coords), None, dtype=object)
+        known = codes >= 0
+        result[known] = self.zone_index.names[codes[known]]
+        for i in np.flatnonzero(codes == GRID_BOUNDARY):
+            result[i] = find_zone_exact(round(coords[i, 0], QUANTISE_DECIMALS), round(coords[i, 1], QUANTISE_DECIMALS))
+        return result.tolist()
+
+    def find_zone(self, lat, lon):
+        """Return the zone name containing (lat, lon), or None"""
+        ny, nx = self.cells.shape
+        col = math.floor((lon - self.bounds[0]) / self.cell_size)
+        row = math.floor((lat - self.bounds[1]) / self.cell_size)
+        if not (0 <= col < nx and 0 <= row < ny):
+            return None
+
+        code = int(self.cells[row, col])
+        if code >= 0:
+            return self.zone_index.names[code]
+        if code == GRID_OUTSIDE:
+            return None
+        return find_zone_exact(round(lat, QUANTISE_DECIMALS), round(lon, QUANTISE_DECIMALS))
+
+def load_zone_index(path=GEOJSON_FILE):
+    """Read the GeoJSON once into a ZoneIndex"""
+    with open(path, "r", encoding="utf-8") as f:
+        features = json.load(f).get("features", [])
+
+    names = []
+    geometries = []
+    for feature in features:
+        zone_name = (feature.get("properties") or {}).get("zone_name")
+        if zone_name and feature.get("geometry"):
+            names.append(zone_name)
+            geometries.append(shape(feature["geometry"]))
+    return ZoneIndex(names, geometries)
+
+# Global variables holding the process-wide zone index and grid
+_zone_index = None
+_zone_grid = None
+_lock = threading.Lock()
+
+def get_zone_index():
+    """Return the shared zone index, loading it on first use"""
+    global _zone_index
+
+    if _zone_index is None:
+        with _lock:
+            if _zone_index is None:
+                try:
+                    _zone_index = load_zone_index()
+                except Exception as e:
+                    print(f"Error loading zone index: {e}")
+                    return None
+    return _zone_index
+
+@lru_cache(maxsize=4096)
+def find_zone_exact(lat, lon):
+    """Exact polygon test for quantised coordinates (repeat GPS fixes hit the cache)"""
+    return get_zone_index().find_zone(lat, lon)
+
+def get_zone_grid():
+    """Return the shared raster grid, loading or building it on first use.
+
+    Returns None when the grid is disabled (ZONE_GRID_CELL_SIZE=0) or the
+    zone index is unavailable.
+    """
+    global _zone_grid
+
+    if _zone_grid is None and ZONE_GRID_CELL_SIZE > 0:
+        zone_index = get_zone_index()
+        if zone_index is None:
+            return None
+        with _lock:
+            if _zone_grid is None:
+                try:
+                    source_mtime = os.path.getmtime(GEOJSON_FILE)
+                    grid = None
+                    if os.path.exists(ZONE_GRID_FILE):
+                        grid = ZoneGrid.load(zone_index, ZONE_GRID_FILE, ZONE_GRID_CELL_SIZE, source_mtime)
+                    if grid is None:
+                        grid = ZoneGrid.build(zone_index, ZONE_GRID_CELL_SIZE)
+                        grid.save(ZONE_GRID_FILE, source_mtime)
+                    _zone_grid = grid
+                except Exception as e:
+                    print(f"Error preparing zone grid: {e}")
+                    return None
+    return _zone_grid
+
+def tag_csv(input_path, output_path):
+    """Bulk-tag a CSV of farmer coordinates (lat, lon columns) with their zone"""
+    with open(input_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        return 0
+
+    zones = (get_zone_grid() or get_zone_index()).find_zones([(float(r["lat"]), float(r["lon"])) for r in rows])
+
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) + ["zone_name"])
+        writer.writeheader()
+        for row, zone in zip(rows, zones):
+            writer.writerow({**row, "zone_name": zone or ""})
+    return len(rows)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python zone_index.py <input.csv> <output.csv>")
+        sys.exit(1)
+    print(f"Tagged {tag_csv(sys.argv[1], sys.argv[2])} rows")